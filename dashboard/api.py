@@ -0,0 +1,41 @@
+# api.py
+
+"""
+  Points d'entrée JSON servis par le serveur Flask du dashboard.
+"""
+
+import flask
+
+from app import app
+from symbols import search_symbol_options, SEARCH_LIMIT
+from screener import screen, CRITERIA, YEAR_DAYS
+
+server = app.server
+
+
+@server.route("/api/symbols")
+def api_symbols():
+    """Search-as-you-type over the active companies: /api/symbols?q=air&limit=20"""
+    query = flask.request.args.get("q", "")
+    try:
+        limit = min(int(flask.request.args.get("limit", SEARCH_LIMIT)), 100)
+    except ValueError:
+        limit = SEARCH_LIMIT
+    return flask.jsonify(search_symbol_options(query, limit=limit))
+
+
+@server.route("/api/screener")
+def api_screener():
+    """Screen every company: /api/screener?criterion=gainers&window=20&as_of=2024-05-31&limit=50"""
+    args = flask.request.args
+    criterion = args.get("criterion", "gainers")
+    if criterion not in CRITERIA:
+        return flask.jsonify({"error": f"unknown criterion, one of {sorted(CRITERIA)}"}), 400
+    try:
+        window = max(2, min(int(args.get("window", 20)), YEAR_DAYS))
+        limit = max(1, min(int(args.get("limit", 50)), 1000))
+        min_volume = float(args.get("min_volume", 0))
+    except ValueError:
+        return flask.jsonify({"error": "window, limit and min_volume must be numbers"}), 400
+    df = screen(criterion, window, args.get("as_of") or None, limit, min_volume)
+    return flask.Response(df.to_json(orient="records"), mimetype="application/json")
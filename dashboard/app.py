@@ -1,25 +1,65 @@
-import numpy as np
-import pandas as pd
-import sqlalchemy
-import datetime
 import time
+_import_start = time.perf_counter()
+
+import os
+import threading
 
 import dash
 import dash_bootstrap_components as dbc
+import diskcache
 
 import timescaledb_model as tsdb
 
-db = tsdb.TimescaleStockMarketModel('bourse', 'ricou', 'db', 'monmdp')
+STARTUP_BUDGET = float(os.environ.get("DASHBOARD_STARTUP_BUDGET", "3"))  # seconds
+JOBS_DIR = os.environ.get("DASHBOARD_JOBS_DIR", "/tmp/bourse-jobs")
+
+
+class LazyModel:
+    """The TimescaleStockMarketModel, built on first use instead of at import time.
+
+    The dashboard only reads the database so the model is created read-only,
+    without the schema probe and setup of the ETL.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._args = args
+        self._kwargs = kwargs
+        self._model = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = tsdb.TimescaleStockMarketModel(*self._args, **self._kwargs)
+        return self._model
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+db = LazyModel('bourse', 'ricou', 'db', 'monmdp', readonly=True)
 external_stylesheets=[dbc.themes.BOOTSTRAP]
-app = dash.Dash(__name__,  title="Bourse", suppress_callback_exceptions=True,
+# long callbacks (background=True) run as jobs outside the gunicorn threads,
+# their state is in a diskcache shared by all the workers
+background_callback_manager = dash.DiskcacheManager(diskcache.Cache(JOBS_DIR))
+# compress: callback responses (figures, grid pages) are gzipped by flask-compress
+app = dash.Dash(__name__,  title="Bourse", suppress_callback_exceptions=True, compress=True,
+                background_callback_manager=background_callback_manager,
                 external_stylesheets=external_stylesheets, assets_ignore='style.css?v=1.0')
-app.df = pd.DataFrame()
-app.daydf = pd.DataFrame()
-app.comp_names = []
 server = app.server
 
+# before the tabs register their callbacks
+import metrics
+metrics.instrument(app, db)
+
 from index import layout
 app.layout = layout
 
+startup_time = time.perf_counter() - _import_start
+print(f"Dashboard ready in {startup_time:.2f}s (budget {STARTUP_BUDGET:.2f}s)")
+if startup_time > STARTUP_BUDGET:
+    print(f"WARNING: dashboard startup over budget by {startup_time - STARTUP_BUDGET:.2f}s")
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,164 @@
+// Rendu du graphique de tab1 dans le navigateur.
+// Les séries (series-store) arrivent du serveur en tableaux typés base64 ;
+// type de graphique, échelle Y et indicateurs sont appliqués ici, sans
+// aller-retour avec le serveur.
+
+(function () {
+    const GL_THRESHOLD = 5000;  // same as figures.GL_THRESHOLD
+    // plotly.colors.qualitative.Plotly
+    const COLORS = ["#636EFA", "#EF553B", "#00CC96", "#AB63FA", "#FFA15A",
+                    "#19D3F3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52"];
+    const GRID = {gridcolor: "#EBF0F8", linecolor: "#EBF0F8", zerolinecolor: "#EBF0F8"};
+
+    function decode(spec) {
+        const bin = atob(spec.bdata);
+        const bytes = new Uint8Array(bin.length);
+        for (let i = 0; i < bin.length; i++) {
+            bytes[i] = bin.charCodeAt(i);
+        }
+        return spec.dtype === "f8" ? new Float64Array(bytes.buffer) : new Float32Array(bytes.buffer);
+    }
+
+    // pandas rolling(window).mean()
+    function rollingMean(y, window) {
+        const out = new Float64Array(y.length).fill(NaN);
+        let sum = 0;
+        for (let i = 0; i < y.length; i++) {
+            sum += y[i];
+            if (i >= window) {
+                sum -= y[i - window];
+            }
+            if (i >= window - 1) {
+                out[i] = sum / window;
+            }
+        }
+        return out;
+    }
+
+    // pandas rolling(window).std(), ddof = 1
+    function rollingStd(y, window, mean) {
+        const out = new Float64Array(y.length).fill(NaN);
+        for (let i = window - 1; i < y.length; i++) {
+            let ss = 0;
+            for (let j = i - window + 1; j <= i; j++) {
+                ss += (y[j] - mean[i]) * (y[j] - mean[i]);
+            }
+            out[i] = Math.sqrt(ss / (window - 1));
+        }
+        return out;
+    }
+
+    // pandas ewm(span, adjust=False).mean()
+    function ema(y, span) {
+        const alpha = 2 / (span + 1);
+        const out = new Float64Array(y.length);
+        for (let i = 0; i < y.length; i++) {
+            out[i] = i === 0 ? y[0] : alpha * y[i] + (1 - alpha) * out[i - 1];
+        }
+        return out;
+    }
+
+    // same as tab1 before: simple rolling means of gains and losses
+    function rsi(y, window) {
+        const gain = new Float64Array(y.length);
+        const loss = new Float64Array(y.length);
+        for (let i = 1; i < y.length; i++) {
+            const delta = y[i] - y[i - 1];
+            gain[i] = delta > 0 ? delta : 0;
+            loss[i] = delta < 0 ? -delta : 0;
+        }
+        const avgGain = rollingMean(gain, window);
+        const avgLoss = rollingMean(loss, window);
+        return avgGain.map((g, i) => 100 - 100 / (1 + g / avgLoss[i]));
+    }
+
+    function line(type, x, y, name, extra) {
+        return Object.assign({type: type, mode: "lines", x: x, y: y, name: name}, extra || {});
+    }
+
+    function layout(yaxisType) {
+        return {
+            title: {
+                text: "Évolution des actions sélectionnées<br>"
+                    + "<sub>Astuce: cliquez sur une action dans la légende pour l'afficher/masquer</sub>",
+                x: 0.5,
+                xanchor: "center"
+            },
+            xaxis: Object.assign({title: {text: "Date"}, type: "date"}, GRID),
+            yaxis: Object.assign({title: {text: "Prix"}, type: yaxisType}, GRID),
+            margin: {l: 40, r: 20, t: 70, b: 40},
+            legend: {title: {text: "Actions"}},
+            paper_bgcolor: "white",
+            plot_bgcolor: "white",
+            colorway: COLORS,
+            showlegend: true
+        };
+    }
+
+    function render(data, chartType, yaxisType, indicators) {
+        indicators = indicators || [];
+        if (!data || !data.symbols || data.symbols.length === 0) {
+            return {data: [], layout: layout(yaxisType)};
+        }
+        const series = data.symbols.map(symbol => {
+            const s = data.series[symbol];
+            return {symbol: symbol, x: decode(s.x), open: decode(s.open), high: decode(s.high),
+                    low: decode(s.low), close: decode(s.close)};
+        });
+
+        // WebGL once the figure holds many points, lines per symbol count too
+        const linesPerSymbol = 1 + indicators.length + (chartType === "bollinger" ? 2 : 0);
+        const points = series.reduce((n, s) => n + s.x.length, 0);
+        const type = points * linesPerSymbol > GL_THRESHOLD ? "scattergl" : "scatter";
+
+        const traces = [];
+        series.forEach((s, k) => {
+            const n = s.x.length;
+            if (chartType === "line") {
+                traces.push(line(type, s.x, s.close, s.symbol));
+            } else if (chartType === "candlestick") {
+                traces.push({type: "candlestick", x: s.x, open: s.open, high: s.high,
+                             low: s.low, close: s.close, name: s.symbol});
+            } else if (chartType === "bollinger" && n >= 20) {
+                const color = COLORS[k % COLORS.length];
+                const group = "bollinger_" + s.symbol;
+                const mean = rollingMean(s.close, 20);
+                const std = rollingStd(s.close, 20, mean);
+                traces.push(line(type, s.x, mean, s.symbol,
+                    {line: {color: color, dash: "dash"}, legendgroup: group, showlegend: true}));
+                traces.push(line(type, s.x, mean.map((m, i) => m + 2 * std[i]), s.symbol + " - Upper",
+                    {line: {color: color, width: 0.5}, legendgroup: group, showlegend: false}));
+                traces.push(line(type, s.x, mean.map((m, i) => m - 2 * std[i]), s.symbol + " - Lower",
+                    {line: {color: color, width: 0.5}, legendgroup: group, showlegend: false,
+                     fill: "tonexty", fillcolor: "rgba(0,0,0,0)"}));
+            }
+            if (indicators.includes("sma20") && n >= 20) {
+                traces.push(line(type, s.x, rollingMean(s.close, 20), s.symbol + " - SMA20",
+                    {line: {dash: "dash", color: "blue"}}));
+            }
+            if (indicators.includes("ema20") && n >= 20) {
+                traces.push(line(type, s.x, ema(s.close, 20), s.symbol + " - EMA20",
+                    {line: {dash: "dot", color: "green"}}));
+            }
+            if (indicators.includes("rsi14") && n >= 14) {
+                traces.push(line(type, s.x, rsi(s.close, 14), s.symbol + " - RSI14",
+                    {line: {color: "red"}}));
+            }
+        });
+        return {data: traces, layout: layout(yaxisType)};
+    }
+
+    // the series of the selected symbols come from the shared series-store,
+    // in live mode the figure belongs to assets/live.js
+    function renderFromStore(store, symbols, start, end, version, chartType, yaxisType, indicators, live) {
+        if (live && live.includes("live")) {
+            return window.dash_clientside.no_update;
+        }
+        const data = window.dash_clientside.series.collect(store, symbols, start, end, version);
+        return render(data, chartType, yaxisType, indicators);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        charts: {render: render, renderFromStore: renderFromStore, decode: decode, layout: layout}
+    });
+})();
@@ -0,0 +1,159 @@
+// Rafraîchissement en direct de tab1 (live.py côté serveur).
+// À chaque tick de live-interval on demande, par symbole, les lignes de stocks
+// plus récentes que la dernière dessinée ; elles sont ajoutées au graphique
+// avec extendData et les indicateurs avancent d'un pas par ligne, à partir de
+// l'état gardé dans live-state, sans recalculer toute la série.
+
+(function () {
+    const noUpdate = () => window.dash_clientside.no_update;
+    const WINDOW = {sma20: 20, ema20: 20, rsi14: 14};  // the bands use the SMA20 window
+
+    function options(chartType, yaxisType, indicators) {
+        return {chartType: chartType, yaxisType: yaxisType, indicators: (indicators || []).slice().sort()};
+    }
+
+    // {symbols, since, reset} for the rows newer than the ones drawn
+    function request(n, live, symbols, chartType, yaxisType, indicators, state) {
+        if (!live || !live.includes("live") || !symbols || symbols.length === 0) {
+            return noUpdate();
+        }
+        const opts = options(chartType, yaxisType, indicators);
+        // switching live on replaces the daily figure of charts.js
+        const triggered = ((window.dash_clientside.callback_context || {}).triggered || [])
+            .map(t => t.prop_id);
+        const reset = !state || triggered.includes("live-refresh.value")
+            || JSON.stringify([state.symbols, state.options]) !== JSON.stringify([symbols, opts]);
+        const since = {};
+        symbols.forEach(symbol => {
+            const s = reset ? null : state.series[symbol];
+            since[symbol] = s && s.last !== null ? s.last : null;
+        });
+        return {symbols: symbols, since: since, reset: reset, options: opts, n: n};
+    }
+
+    function mean(values) {
+        return values.reduce((a, b) => a + b, 0) / values.length;
+    }
+
+    function push(tail, value, size) {
+        tail.push(value);
+        if (tail.length > size) {
+            tail.shift();
+        }
+    }
+
+    // one step of the indicators of a symbol, same formulas as assets/charts.js
+    function step(st, v) {
+        const out = {};
+        push(st.tail, v, WINDOW.sma20);
+        const full = st.tail.length === WINDOW.sma20;
+        out.sma20 = full ? mean(st.tail) : NaN;
+        if (full) {
+            const m = out.sma20;
+            const std = Math.sqrt(st.tail.reduce((a, x) => a + (x - m) * (x - m), 0) / (WINDOW.sma20 - 1));
+            out.mean = m;
+            out.upper = m + 2 * std;
+            out.lower = m - 2 * std;
+        } else {
+            out.mean = out.upper = out.lower = NaN;
+        }
+        const alpha = 2 / (WINDOW.ema20 + 1);
+        st.ema = st.ema === null ? v : alpha * v + (1 - alpha) * st.ema;
+        out.ema20 = st.count + 1 >= WINDOW.ema20 ? st.ema : NaN;
+        const delta = st.prev === null ? 0 : v - st.prev;
+        push(st.gains, delta > 0 ? delta : 0, WINDOW.rsi14);
+        push(st.losses, delta < 0 ? -delta : 0, WINDOW.rsi14);
+        out.rsi14 = st.gains.length === WINDOW.rsi14
+            ? 100 - 100 / (1 + mean(st.gains) / mean(st.losses)) : NaN;
+        st.prev = v;
+        st.count += 1;
+        return out;
+    }
+
+    // traces of a symbol: [kind, name suffix, style]
+    function kinds(opts) {
+        const out = [["value", "", {}]];
+        if (opts.chartType === "bollinger") {
+            out.push(["mean", " - Moyenne", {line: {dash: "dash"}}]);
+            out.push(["upper", " - Upper", {line: {width: 0.5}, showlegend: false}]);
+            out.push(["lower", " - Lower", {line: {width: 0.5}, showlegend: false}]);
+        }
+        if (opts.indicators.includes("sma20")) {
+            out.push(["sma20", " - SMA20", {line: {dash: "dash", color: "blue"}}]);
+        }
+        if (opts.indicators.includes("ema20")) {
+            out.push(["ema20", " - EMA20", {line: {dash: "dot", color: "green"}}]);
+        }
+        if (opts.indicators.includes("rsi14")) {
+            out.push(["rsi14", " - RSI14", {line: {color: "red"}}]);
+        }
+        return out;
+    }
+
+    // x and y of every trace of symbol for its new rows, the state moved on
+    function advance(st, rows, traceKinds) {
+        const x = Array.from(rows.x), y = Array.from(rows.y);
+        const ys = traceKinds.map(() => []);
+        y.forEach(v => {
+            const values = step(st, v);
+            values.value = v;
+            traceKinds.forEach(([kind], k) => ys[k].push(Number.isNaN(values[kind]) ? null : values[kind]));
+        });
+        if (x.length) {
+            st.last = x[x.length - 1];
+        }
+        return {x: x, ys: ys};
+    }
+
+    function newState() {
+        return {last: null, tail: [], ema: null, prev: null, gains: [], losses: [], count: 0};
+    }
+
+    // the new rows from the server: a whole figure after a reset, else extendData
+    function apply(delta, state) {
+        if (!delta || !delta.request) {
+            return [noUpdate(), noUpdate(), noUpdate()];
+        }
+        const charts = window.dash_clientside.charts;
+        const req = delta.request;
+        const traceKinds = kinds(req.options);
+        const decode = spec => spec ? charts.decode(spec) : [];
+        if (req.reset || !state) {
+            state = {symbols: req.symbols, options: req.options, series: {}};
+            const traces = [];
+            req.symbols.forEach(symbol => {
+                const st = state.series[symbol] = newState();
+                const rows = delta.series[symbol] || {};
+                const {x, ys} = advance(st, {x: decode(rows.x), y: decode(rows.y)}, traceKinds);
+                traceKinds.forEach(([kind, suffix, style], k) => traces.push(Object.assign(
+                    {type: "scatter", mode: "lines", x: x.slice(), y: ys[k], name: symbol + suffix,
+                     legendgroup: symbol}, style)));
+            });
+            const layout = charts.layout(req.options.yaxisType);
+            layout.title.text = "Cours en temps réel (10 minutes)";
+            return [{data: traces, layout: layout}, noUpdate(), state];
+        }
+        state = JSON.parse(JSON.stringify(state));
+        const update = {x: [], y: []}, indices = [];
+        req.symbols.forEach((symbol, i) => {
+            const rows = delta.series[symbol];
+            if (!rows) {
+                return;
+            }
+            const {x, ys} = advance(state.series[symbol], {x: decode(rows.x), y: decode(rows.y)}, traceKinds);
+            traceKinds.forEach((_, k) => {
+                update.x.push(x);
+                update.y.push(ys[k]);
+                indices.push(i * traceKinds.length + k);
+            });
+        });
+        if (indices.length === 0) {
+            return [noUpdate(), noUpdate(), noUpdate()];
+        }
+        return [noUpdate(), [update, indices], state];
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        live: {request: request, apply: apply}
+    });
+})();
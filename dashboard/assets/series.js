@@ -0,0 +1,206 @@
+// Séries journalières partagées entre les onglets (series-store, sessionStorage).
+// Une série est rangée sous la clé symbole|début|fin|version des données :
+// changer d'onglet réutilise ce qui est déjà dans le navigateur et seules les
+// clés manquantes sont demandées au serveur (series-request).
+
+(function () {
+    const MAX_SERIES = 40;  // series kept in the store, the oldest go first
+    const noUpdate = () => window.dash_clientside.no_update;
+
+    function day(date) {
+        return date ? String(date).slice(0, 10) : "";
+    }
+
+    function key(symbol, start, end, version) {
+        return [symbol, day(start), day(end), version || ""].join("|");
+    }
+
+    // the keys of store missing for symbols, as a series-request
+    function missing(symbols, start, end, version, store) {
+        if (!symbols || !start || !end) {
+            return null;
+        }
+        store = store || {};
+        const items = [];
+        symbols.forEach(symbol => {
+            const k = key(symbol, start, end, version);
+            if (!(k in store)) {
+                items.push({key: k, symbol: symbol, start: day(start), end: day(end)});
+            }
+        });
+        if (items.length === 0) {
+            return null;
+        }
+        const keys = Object.keys(store);
+        const evict = keys.slice(0, Math.max(0, keys.length + items.length - MAX_SERIES));
+        return {items: items, evict: evict};
+    }
+
+    function request(symbols, start, end, version, store) {
+        if (typeof symbols === "string") {
+            symbols = [symbols];
+        }
+        const req = missing(symbols, start, end, version, store);
+        return req === null ? noUpdate() : req;
+    }
+
+    // {symbols, series} for the symbols already in the store
+    function collect(store, symbols, start, end, version) {
+        const data = {symbols: [], series: {}};
+        (symbols || []).forEach(symbol => {
+            const s = (store || {})[key(symbol, start, end, version)];
+            if (s) {
+                data.symbols.push(symbol);
+                data.series[symbol] = s;
+            }
+        });
+        return data;
+    }
+
+    function decode(spec) {
+        const bin = atob(spec.bdata);
+        const bytes = new Uint8Array(bin.length);
+        for (let i = 0; i < bin.length; i++) {
+            bytes[i] = bin.charCodeAt(i);
+        }
+        return spec.dtype === "f8" ? new Float64Array(bytes.buffer) : new Float32Array(bytes.buffer);
+    }
+
+    // float32 values printed as PostgreSQL prints FLOAT4
+    function float4(v) {
+        return Number.isNaN(v) ? null : parseFloat(v.toPrecision(7));
+    }
+
+    // rows of tab2 (same columns as the SQL of tabs/tab2.py)
+    function rows(symbol, s) {
+        const x = decode(s.x), open = decode(s.open), high = decode(s.high), low = decode(s.low);
+        const close = decode(s.close), volume = decode(s.volume);
+        const out = [];
+        for (let i = 0; i < x.length; i++) {
+            // standard deviation of the close over a centered window of 7 rows
+            const lo = Math.max(0, i - 3), hi = Math.min(x.length - 1, i + 3);
+            let std = null;
+            if (hi > lo) {
+                let sum = 0, ss = 0;
+                for (let j = lo; j <= hi; j++) {
+                    sum += close[j];
+                }
+                const mean = sum / (hi - lo + 1);
+                for (let j = lo; j <= hi; j++) {
+                    ss += (close[j] - mean) * (close[j] - mean);
+                }
+                std = Math.sqrt(ss / (hi - lo));
+            }
+            out.push({
+                symbol: symbol,
+                date: new Date(x[i]).toISOString().slice(0, 10),
+                open: float4(open[i]), high: float4(high[i]), low: float4(low[i]),
+                close: float4(close[i]), volume: float4(volume[i]), ecart_type: std
+            });
+        }
+        return out;
+    }
+
+    function test(value, condition) {
+        let a, b;
+        if (condition.filterType === "date") {
+            a = condition.dateFrom ? condition.dateFrom.slice(0, 10) : null;
+            b = condition.dateTo ? condition.dateTo.slice(0, 10) : null;
+        } else {
+            a = condition.filter;
+            b = condition.filterTo;
+        }
+        switch (condition.type) {
+            case "equals": return value === a;
+            case "notEqual": return value !== a;
+            case "lessThan": return value !== null && value < a;
+            case "lessThanOrEqual": return value !== null && value <= a;
+            case "greaterThan": return value !== null && value > a;
+            case "greaterThanOrEqual": return value !== null && value >= a;
+            case "inRange": return value !== null && value >= a && value <= b;
+            case "blank": return value === null;
+            case "notBlank": return value !== null;
+            default: return true;
+        }
+    }
+
+    function filterRows(data, filterModel) {
+        Object.entries(filterModel || {}).forEach(([col, model]) => {
+            const conditions = model.conditions || [model];
+            const any = model.operator === "OR";
+            data = data.filter(row => any
+                ? conditions.some(c => test(row[col], c))
+                : conditions.every(c => test(row[col], c)));
+        });
+        return data;
+    }
+
+    function sortRows(data, sortModel) {
+        if (!sortModel || sortModel.length === 0) {
+            return data;
+        }
+        return data.slice().sort((r1, r2) => {
+            for (const sort of sortModel) {
+                const a = r1[sort.colId], b = r2[sort.colId];
+                if (a === b) {
+                    continue;
+                }
+                const cmp = a === null ? 1 : b === null ? -1 : (a < b ? -1 : 1);
+                return sort.sort === "desc" ? -cmp : cmp;
+            }
+            return 0;
+        });
+    }
+
+    // a page of the tab2 grid from the store, or the request for the server
+    function gridRows(request, store, symbol, start, end, version) {
+        if (!request || !symbol) {
+            return [noUpdate(), noUpdate()];
+        }
+        const s = (store || {})[key(symbol, start, end, version)];
+        if (!s) {
+            return [noUpdate(), request];
+        }
+        const data = sortRows(filterRows(rows(symbol, s), request.filterModel), request.sortModel);
+        return [{rowData: data.slice(request.startRow, request.endRow), rowCount: data.length}, noUpdate()];
+    }
+
+    // selections shared by the tabs (ui-store)
+    function restore(_, ui, field) {
+        ui = ui || {};
+        return [ui[field] !== undefined ? ui[field] : noUpdate(),
+                ui.start_date || noUpdate(), ui.end_date || noUpdate()];
+    }
+
+    function save(value, start, end, ui, field) {
+        const out = Object.assign({}, ui || {}, {start_date: start, end_date: end});
+        out[field] = value;
+        return out;
+    }
+
+    // a row selected in the screener joins the symbols of tab1
+    function addSymbol(rows, ui) {
+        const symbol = ((rows || [])[0] || {}).symbol;
+        const symbols = ((ui || {}).symbols || []);
+        if (!symbol || symbols.includes(symbol)) {
+            return noUpdate();
+        }
+        return Object.assign({}, ui || {}, {symbols: symbols.concat([symbol])});
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        series: {
+            key: key,
+            request: request,
+            collect: collect,
+            gridRows: gridRows,
+            restoreSymbols: (id, ui) => restore(id, ui, "symbols"),
+            saveSymbols: (value, start, end, ui) => save(value, start, end, ui, "symbols"),
+            // tab2 starts on the first symbol of tab1, already in the store
+            restoreSymbol: (id, ui) => restore(id, Object.assign(
+                {symbol: ((ui || {}).symbols || [])[0]}, ui || {}), "symbol"),
+            saveSymbol: (value, start, end, ui) => save(value, start, end, ui, "symbol"),
+            addSymbol: addSymbol
+        }
+    });
+})();
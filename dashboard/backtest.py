@@ -0,0 +1,245 @@
+# backtest.py
+
+"""
+  Backtests vectorisés des stratégies construites sur les indicateurs de tab1
+  (SMA, EMA, RSI, Bollinger), pour beaucoup de sociétés à la fois.
+
+  Les indicateurs, les signaux, les positions et les rendements sont calculés
+  sur toute la matrice sociétés x jours du cube de prix avec NumPy : pas de
+  boucle Python par jour ni par société. Une stratégie à états (entrée sur un
+  seuil, sortie sur un autre) s'obtient en propageant le dernier événement.
+
+  Un balayage de paramètres répartit ses points sur plusieurs processus ;
+  chacun rouvre le cube mappé en mémoire, rien n'est copié entre eux. Ce
+  module n'importe pas l'application pour que ces processus démarrent vite.
+"""
+
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from pricecube import PriceCube
+
+YEAR_DAYS = 252
+EMA_BLOCK = 64  # days per block of the EMA scan, keeps (1 - alpha) ** -k finite
+
+# strategy -> (label, parameter grid)
+STRATEGIES = {
+    "sma": ("Clôture au-dessus de la SMA", {"window": [10, 20, 50, 100, 200]}),
+    "ema_cross": ("EMA rapide au-dessus de l'EMA lente", {"fast": [5, 10, 20], "slow": [50, 100, 200]}),
+    "rsi": ("RSI : achat sous le seuil bas, vente au-dessus du seuil haut",
+            {"window": [7, 14, 21], "low": [20, 30], "high": [70, 80]}),
+    "bollinger": ("Bollinger : achat sous la bande basse, vente à la moyenne",
+                  {"window": [20, 50], "width": [1.5, 2.0, 2.5]}),
+}
+
+
+# ------------------------------ indicators --------------------------------
+# all take a cids x days matrix and work along the days
+
+def forward_fill(values):
+    """Forward fill the NaN along the days, leading NaN stay."""
+    valid = ~np.isnan(values)
+    idx = np.where(valid, np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return values[np.arange(values.shape[0])[:, None], idx]
+
+
+def _rolling_sums(values, window):
+    valid = ~np.isnan(values)
+    zero = np.zeros((values.shape[0], 1))
+    s = np.concatenate([zero, np.cumsum(np.where(valid, values, 0.0), axis=1)], axis=1)
+    ss = np.concatenate([zero, np.cumsum(np.where(valid, values * values, 0.0), axis=1)], axis=1)
+    n = np.concatenate([zero, np.cumsum(valid, axis=1)], axis=1)
+    pad = np.full((values.shape[0], window - 1), np.nan)
+    diff = lambda c: np.concatenate([pad, c[:, window:] - c[:, :-window]], axis=1)
+    return diff(n), diff(s), diff(ss)
+
+
+def rolling_mean(values, window):
+    """pandas rolling(window).mean() on each row."""
+    n, s, _ = _rolling_sums(values, window)
+    return np.where(n == window, s / window, np.nan)
+
+
+def rolling_std(values, window):
+    """pandas rolling(window).std() on each row, ddof = 1."""
+    n, s, ss = _rolling_sums(values, window)
+    var = (ss - s * s / window) / (window - 1)
+    return np.where(n == window, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def ema(values, span):
+    """pandas ewm(span, adjust=False).mean() on each row, started at its first value.
+
+    y[t] = (1 - a) y[t-1] + a x[t] is solved by blocks of EMA_BLOCK days with
+    cumulative sums, the last value of a block seeding the next one.
+    """
+    alpha = 2.0 / (span + 1)
+    beta = 1.0 - alpha
+    leading = np.isnan(values)
+    first = np.argmax(~leading, axis=1)
+    x = np.where(leading, values[np.arange(values.shape[0]), first][:, None], values)
+    x = np.nan_to_num(x)  # rows without any value
+    out = np.empty_like(x)
+    prev = x[:, 0]
+    for lo in range(0, x.shape[1], EMA_BLOCK):
+        block = x[:, lo:lo + EMA_BLOCK]
+        k = np.arange(block.shape[1])
+        down = beta ** (k + 1)
+        acc = np.cumsum(block * beta ** -k, axis=1) * alpha * beta ** k
+        out[:, lo:lo + EMA_BLOCK] = prev[:, None] * down + acc
+        prev = out[:, lo + block.shape[1] - 1]
+    out[leading & (np.arange(x.shape[1]) < first[:, None])] = np.nan
+    return out
+
+
+def rsi(values, window):
+    """RSI with simple rolling means of gains and losses, as in assets/charts.js."""
+    delta = np.diff(values, axis=1, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    gain[np.isnan(delta)] = np.nan
+    loss[np.isnan(delta)] = np.nan
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 - 100 / (1 + rolling_mean(gain, window) / rolling_mean(loss, window))
+
+
+# ------------------------------ strategies --------------------------------
+
+def _hold(entry, exit_):
+    """Position 1 from an entry until the next exit, propagating the last event."""
+    events = np.where(entry, 1.0, np.where(exit_, 0.0, np.nan))
+    return np.nan_to_num(forward_fill(events), nan=0.0)
+
+
+def positions(close, strategy, params):
+    """Long (1) or flat (0) position decided at each close, None for an invalid point."""
+    with np.errstate(invalid="ignore"):
+        if strategy == "sma":
+            return (close > rolling_mean(close, params["window"])).astype(np.float64)
+        if strategy == "ema_cross":
+            if params["fast"] >= params["slow"]:
+                return None
+            return (ema(close, params["fast"]) > ema(close, params["slow"])).astype(np.float64)
+        if strategy == "rsi":
+            r = rsi(close, params["window"])
+            return _hold(r < params["low"], r > params["high"])
+        if strategy == "bollinger":
+            mean = rolling_mean(close, params["window"])
+            lower = mean - params["width"] * rolling_std(close, params["window"])
+            return _hold(close < lower, close > mean)
+    raise ValueError(f"unknown strategy {strategy}")
+
+
+def daily_returns(close):
+    """Close to close returns, 0 where a day is missing."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = close[:, 1:] / close[:, :-1] - 1
+    r = np.where(np.isfinite(r), r, 0.0)
+    return np.concatenate([np.zeros((close.shape[0], 1)), r], axis=1)
+
+
+def strategy_returns(close, pos, cost=0.0):
+    """Daily returns of each company held per pos, the position of a close held the next day.
+
+    cost is the fraction of the traded amount paid at each change of position.
+    """
+    held = np.concatenate([np.zeros((pos.shape[0], 1)), pos[:, :-1]], axis=1)
+    turnover = np.abs(np.diff(pos, axis=1, prepend=0.0))
+    return held * daily_returns(close) - cost * turnover
+
+
+def summary(returns, pos=None):
+    """Total return, annualized return and Sharpe, max drawdown of a daily return series."""
+    equity = np.cumprod(1 + returns)
+    years = max(len(returns) / YEAR_DAYS, 1 / YEAR_DAYS)
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    peak = np.maximum.accumulate(equity)
+    result = {
+        "total_return": float(equity[-1] - 1) if len(equity) else 0.0,
+        "annual_return": float(equity[-1] ** (1 / years) - 1) if len(equity) and equity[-1] > 0 else -1.0,
+        "sharpe": float(returns.mean() / std * np.sqrt(YEAR_DAYS)) if std > 0 else 0.0,
+        "max_drawdown": float((equity / peak - 1).min()) if len(equity) else 0.0,
+    }
+    if pos is not None:
+        result["trades"] = int((np.diff(pos, axis=1, prepend=0.0) > 0).sum())
+        result["exposure"] = float(pos.mean())
+    return result
+
+
+def portfolio(returns, alive):
+    """Equal weight over the companies with a close on each day."""
+    count = alive.sum(axis=0)
+    return np.where(count > 0, (returns * alive).sum(axis=0) / np.maximum(count, 1), 0.0)
+
+
+# ------------------------------ runs --------------------------------
+
+_loaded = {}  # (directory, cids, start, end) -> (close, alive, days), per process
+
+
+def load(directory, cids, start=None, end=None):
+    """Forward filled closes of cids between start and end, the days with a close and the days."""
+    key = (directory, tuple(cids), start, end)
+    if key not in _loaded:
+        _loaded.clear()
+        cube = PriceCube(directory)
+        raw, days = cube.matrix("close", cids, start, end)
+        raw = raw.astype(np.float64)
+        _loaded[key] = (forward_fill(raw), ~np.isnan(raw), days)
+    return _loaded[key]
+
+
+def evaluate(directory, cids, start, end, strategy, params, cost=0.0, detail=False):
+    """Backtest one point of a strategy on cids; with detail, the equity curves and per company results."""
+    close, alive, days = load(directory, cids, start, end)
+    pos = positions(close, strategy, params)
+    if pos is None or close.shape[1] < 2:
+        return None
+    pos = pos * alive  # no position on a company before its first close
+    returns = strategy_returns(close, pos, cost)
+    result = dict(params, **summary(portfolio(returns, alive), pos))
+    if detail:
+        bench = portfolio(daily_returns(close), alive)
+        result["days"] = days
+        result["equity"] = np.cumprod(1 + portfolio(returns, alive))
+        result["benchmark"] = np.cumprod(1 + bench)
+        result["companies"] = [dict(cid=int(c), **summary(returns[i], pos[i:i + 1]))
+                               for i, c in enumerate(cids)]
+    return result
+
+
+def _evaluate(args):
+    return evaluate(*args)
+
+
+def grid_points(strategy):
+    """Every combination of the parameter grid of strategy."""
+    grid = STRATEGIES[strategy][1]
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def sweep(directory, cids, start, end, strategy, cost=0.0, workers=None, progress=None):
+    """Backtest every point of the grid of strategy, in parallel over workers processes."""
+    points = grid_points(strategy)
+    jobs = [(directory, list(cids), start, end, strategy, p, cost) for p in points]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    results = []
+    if workers <= 1:
+        for i, job in enumerate(jobs):
+            results.append(_evaluate(job))
+            if progress:
+                progress(i + 1, len(jobs))
+    else:
+        # spawn: the caller may hold threads and database connections
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for i, result in enumerate(pool.map(_evaluate, jobs)):
+                results.append(result)
+                if progress:
+                    progress(i + 1, len(jobs))
+    return [r for r in results if r is not None]
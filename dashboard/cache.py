@@ -0,0 +1,112 @@
+# cache.py
+
+"""
+  Cache partagé entre les processus du dashboard (workers gunicorn).
+
+  Si REDIS_URL est défini et que Redis répond, les valeurs y sont stockées
+  (pickle). Sinon elles vont dans des fichiers de CACHE_DIR, ce qui suffit
+  pour plusieurs workers sur une même machine.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+REDIS_URL = os.environ.get("REDIS_URL")
+CACHE_DIR = os.environ.get("DASHBOARD_CACHE_DIR", os.path.join(tempfile.gettempdir(), "bourse-cache"))
+PREFIX = "bourse:"
+
+
+class RedisStore:
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.client.ping()
+
+    def get(self, key):
+        value = self.client.get(PREFIX + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(PREFIX + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(PREFIX + key)
+
+
+class DiskStore:
+    """One pickle file per key, written atomically, the expiry date first."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._file(key), "rb") as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((expires, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._file(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except OSError:
+            pass
+
+
+def _make_store():
+    if REDIS_URL:
+        try:
+            return RedisStore(REDIS_URL)
+        except Exception as e:
+            print(f"Redis unavailable ({e}), cache in {CACHE_DIR}")
+    return DiskStore(CACHE_DIR)
+
+
+_store = None
+
+
+def store():
+    global _store
+    if _store is None:
+        _store = _make_store()
+    return _store
+
+
+def get(key):
+    return store().get(key)
+
+
+def set(key, value, ttl=None):
+    store().set(key, value, ttl)
+
+
+def delete(key):
+    store().delete(key)
+
+
+def get_or_compute(key, compute, ttl=None):
+    """Return the cached value of key, computing and storing it if missing."""
+    value = get(key)
+    if value is None:
+        value = compute()
+        if value is not None:
+            set(key, value, ttl)
+    return value
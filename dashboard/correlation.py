@@ -0,0 +1,125 @@
+# correlation.py
+
+"""
+  Corrélations des rendements journaliers entre sociétés.
+
+  Les rendements (log des clôtures de daystocks, via la matrice de
+  universe.py) forment une matrice sociétés x jours avec des trous. Les
+  corrélations sur les jours communs à chaque paire viennent de produits
+  matriciels NumPy par blocs de lignes (X·Xᵀ, X·Mᵀ, X²·Mᵀ, M·Mᵀ avec M le
+  masque des jours présents), sans boucle sur les paires.
+
+  La matrice est mise en cache par (univers, fenêtre, période, version des
+  données) ; la corrélation glissante d'une paire se calcule par sommes
+  cumulées.
+"""
+
+import hashlib
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import cache
+from universe import get_cube, cache_version, company_labels
+
+BLOCK = 256  # rows of a block of the matrix products
+MIN_PERIODS = 10  # common days under which a correlation is NaN
+RESULT_TTL = 24 * 3600
+
+
+def returns_matrix(cube, cids=None, start=None, end=None):
+    """Daily log returns (cids x days - 1), NaN where a close is missing."""
+    close, _ = cube.matrix("close", cids, start, end)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = np.diff(np.log(close.astype(np.float64)), axis=1)
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def correlation_matrix(returns, min_periods=MIN_PERIODS, block=BLOCK):
+    """Pairwise correlations of the rows of returns over their common days."""
+    mask = (~np.isnan(returns)).astype(np.float64)
+    x = np.where(mask > 0, returns, 0.0)
+    x2 = x * x
+    n_rows = x.shape[0]
+    corr = np.empty((n_rows, n_rows), dtype=np.float32)
+    for lo in range(0, n_rows, block):
+        hi = min(lo + block, n_rows)
+        n = mask[lo:hi] @ mask.T          # common days
+        sx = x[lo:hi] @ mask.T            # sum of row i over the days common with j
+        sy = mask[lo:hi] @ x.T            # sum of row j over the days common with i
+        sxx = x2[lo:hi] @ mask.T
+        syy = mask[lo:hi] @ x2.T
+        sxy = x[lo:hi] @ x.T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * sxy - sx * sy
+            var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+            c = cov / np.sqrt(var)
+        c[(n < min_periods) | ~np.isfinite(c)] = np.nan
+        corr[lo:hi] = np.clip(c, -1, 1)
+    return corr
+
+
+def rolling_correlation(x, y, window, min_periods=MIN_PERIODS):
+    """Rolling correlation of two return series over window days, with cumulative sums."""
+    mask = (~np.isnan(x) & ~np.isnan(y)).astype(np.float64)
+    x = np.where(mask > 0, x, 0.0)
+    y = np.where(mask > 0, y, 0.0)
+
+    def rolled(values):
+        c = np.concatenate([[0.0], np.cumsum(values)])
+        return c[window:] - c[:-window]
+
+    n, sx, sy = rolled(mask), rolled(x), rolled(y)
+    sxx, syy, sxy = rolled(x * x), rolled(y * y), rolled(x * y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        c = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+    c[(n < min(min_periods, window)) | ~np.isfinite(c)] = np.nan
+    return np.clip(c, -1, 1)
+
+
+def _universe_key(cids):
+    return hashlib.sha1(",".join(map(str, sorted(cids))).encode()).hexdigest()[:16]
+
+
+def correlations(cids, window=None, start=None, end=None):
+    """Correlation matrix of cids over the period, or over its last window days.
+
+    Returns (symbols, cids, matrix) with the companies without data left out,
+    cached per (universe, window, period, data version).
+    """
+    cids = sorted(set(int(c) for c in cids))
+    key = f"correlation:{cache_version()}:{_universe_key(cids)}:{window}:{start}:{end}"
+
+    def compute():
+        cube = get_cube()
+        if cube is None or not cids:
+            return None
+        rows = cube.rows(cids)
+        kept = [c for c, r in zip(cids, rows) if r >= 0]
+        returns = returns_matrix(cube, kept, start, end)
+        if window:
+            returns = returns[:, -window:]
+        present = (~np.isnan(returns)).sum(axis=1) >= MIN_PERIODS
+        kept = [c for c, p in zip(kept, present) if p]
+        symbols, _ = company_labels(kept)
+        return symbols, kept, correlation_matrix(returns[present])
+
+    return cache.get_or_compute(key, compute, ttl=RESULT_TTL)
+
+
+def pair_rolling(cid_a, cid_b, window, start=None, end=None):
+    """Rolling correlation of two companies, as a DataFrame (date, correlation)."""
+    cube = get_cube()
+    if cube is None:
+        return pd.DataFrame(columns=["date", "correlation"])
+    days = cube.days[cube.day_range(start, end)]
+    returns = returns_matrix(cube, [cid_a, cid_b], start, end)
+    if returns.shape[1] < window:
+        return pd.DataFrame(columns=["date", "correlation"])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        values = rolling_correlation(returns[0], returns[1], window)
+    # a return is dated by its second day
+    return pd.DataFrame({"date": days[window:].astype("datetime64[ns]"), "correlation": values})
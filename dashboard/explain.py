@@ -0,0 +1,145 @@
+# explain.py
+
+"""
+  Lecture et affichage des plans EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON).
+
+  Les noeuds les plus lents (temps propre, hors enfants) sont surlignés, les
+  écarts entre lignes estimées et réelles sont signalés et, pour les
+  hypertables stocks et daystocks, on indique combien de chunks ont été lus
+  et combien ont été exclus.
+"""
+
+import re
+
+from dash import html
+
+SLOWEST_NODES = 3  # number of highlighted nodes
+MISESTIMATE_RATIO = 10  # estimated vs actual rows ratio considered as wrong
+
+_CHUNK_REGEX = re.compile(r"^_hyper_\d+_\d+_chunk$")
+
+
+def _node_total(node):
+    """Total time spent in a node over all its loops, in ms."""
+    return node.get("Actual Total Time", 0.0) * max(node.get("Actual Loops", 1), 1)
+
+
+def analyze_plan(plan, chunk_hypertables=None):
+    """Flatten a plan tree and compute per node figures.
+
+    plan -- the root "Plan" dict of EXPLAIN FORMAT JSON
+    chunk_hypertables -- chunk name -> hypertable name
+    Returns the list of nodes (dicts) in depth first order.
+    """
+    chunk_hypertables = chunk_hypertables or {}
+    nodes = []
+
+    def visit(node, depth):
+        children = node.get("Plans", [])
+        total = _node_total(node)
+        loops = max(node.get("Actual Loops", 1), 1)
+        info = {
+            "id": len(nodes),
+            "depth": depth,
+            "type": node.get("Node Type", "?"),
+            "relation": node.get("Relation Name"),
+            "index": node.get("Index Name"),
+            "total": total,
+            "self": max(total - sum(_node_total(c) for c in children), 0.0),
+            "plan_rows": node.get("Plan Rows", 0),
+            "actual_rows": node.get("Actual Rows", 0) * loops,
+            "loops": loops,
+            "hit": node.get("Shared Hit Blocks", 0),
+            "read": node.get("Shared Read Blocks", 0),
+            "excluded": (node.get("Chunks excluded during startup", 0)
+                         + node.get("Chunks excluded during runtime", 0)),
+            "hypertable": None,
+            "children": [],
+        }
+        relation = info["relation"] or ""
+        if _CHUNK_REGEX.match(relation):
+            info["hypertable"] = chunk_hypertables.get(relation, "?")
+        nodes.append(info)
+        for child in children:
+            info["children"].append(visit(child, depth + 1)["id"])
+        return info
+
+    visit(plan, 0)
+    return nodes
+
+
+def chunk_summary(nodes, chunk_counts=None):
+    """Return hypertable -> (chunks scanned, chunks excluded, total chunks)."""
+    chunk_counts = chunk_counts or {}
+    scanned = {}
+    for node in nodes:
+        if node["hypertable"]:
+            scanned.setdefault(node["hypertable"], set()).add(node["relation"])
+    summary = {}
+    for hypertable in set(scanned) | {h for h in chunk_counts if h in ("stocks", "daystocks")}:
+        total = chunk_counts.get(hypertable)
+        n = len(scanned.get(hypertable, ()))
+        excluded = total - n if total is not None else None
+        summary[hypertable] = (n, excluded, total)
+    return summary
+
+
+def _misestimated(node):
+    est, actual = max(node["plan_rows"], 1), max(node["actual_rows"], 1)
+    return max(est / actual, actual / est) >= MISESTIMATE_RATIO
+
+
+def _node_label(node, slow_rank):
+    label = node["type"]
+    if node["relation"]:
+        label += f" on {node['relation']}"
+        if node["hypertable"]:
+            label += f" ({node['hypertable']})"
+    if node["index"]:
+        label += f" using {node['index']}"
+    rows = f"rows {node['plan_rows']} est. / {node['actual_rows']} réelles"
+    if node["loops"] > 1:
+        rows += f" ({node['loops']} boucles)"
+    parts = [
+        html.B(label),
+        f" — {node['total']:.2f} ms (propre {node['self']:.2f} ms), ",
+        html.Span(rows, style={"color": "darkorange", "fontWeight": "bold"} if _misestimated(node) else {}),
+        f", buffers hit {node['hit']} / read {node['read']}",
+    ]
+    if node["excluded"]:
+        parts.append(f", {node['excluded']} chunks exclus à l'exécution")
+    style = {}
+    if slow_rank is not None:
+        style = {"backgroundColor": ["#f8d7da", "#fde2c4", "#fff3cd"][min(slow_rank, 2)]}
+    return html.Span(parts, style=style)
+
+
+def render_plan(result, chunk_hypertables=None, chunk_counts=None):
+    """Render the JSON result of EXPLAIN ANALYZE as a tree of Dash components."""
+    if isinstance(result, list):
+        result = result[0]
+    nodes = analyze_plan(result["Plan"], chunk_hypertables)
+    slowest = sorted(nodes, key=lambda n: n["self"], reverse=True)[:SLOWEST_NODES]
+    slow_rank = {n["id"]: rank for rank, n in enumerate(slowest) if n["self"] > 0}
+
+    def tree(node_id):
+        node = nodes[node_id]
+        label = _node_label(node, slow_rank.get(node_id))
+        if not node["children"]:
+            return html.Li(label)
+        return html.Li(html.Details([html.Summary(label),
+                                     html.Ul([tree(c) for c in node["children"]])], open=True))
+
+    summary = [
+        f"Planification {result.get('Planning Time', 0):.2f} ms, "
+        f"exécution {result.get('Execution Time', 0):.2f} ms"
+    ]
+    for hypertable, (n, excluded, total) in sorted(chunk_summary(nodes, chunk_counts).items()):
+        text = f"{hypertable} : {n} chunks lus"
+        if total is not None:
+            text += f" sur {total} ({excluded} exclus)"
+        summary.append(text)
+    return html.Div([
+        html.Div([html.Div(line) for line in summary], style={"fontFamily": "monospace"}),
+        html.Ul([tree(0)], style={"fontFamily": "monospace", "whiteSpace": "normal"}),
+    ])
@@ -0,0 +1,88 @@
+# figures.py
+
+"""
+  Traces Plotly compactes.
+
+  Les séries partent en tableaux typés base64 (float32 pour les prix, float64
+  en millisecondes pour les dates) au lieu de listes de nombres JSON, et les
+  lignes passent en WebGL (scattergl) au-delà de GL_THRESHOLD points. Les
+  traces sont des dict : plotly.js les décode sans passer par graph_objects.
+  Les mêmes encodages servent aux données que assets/charts.js dessine dans
+  le navigateur.
+"""
+
+import base64
+
+import numpy as np
+import pandas as pd
+
+GL_THRESHOLD = 5000  # points in the figure above which lines use WebGL
+
+# plotly.colors.qualitative.Plotly
+COLORS = ["#636EFA", "#EF553B", "#00CC96", "#AB63FA", "#FFA15A",
+          "#19D3F3", "#FF6692", "#B6E880", "#FF97FF", "#FECB52"]
+
+
+# the few parts of the plotly_white template we use, the whole template is
+# only known to plotly.py and would weigh more than the data
+WHITE_LAYOUT = {
+    "paper_bgcolor": "white",
+    "plot_bgcolor": "white",
+    "colorway": COLORS,
+    "xaxis": {"gridcolor": "#EBF0F8", "linecolor": "#EBF0F8", "zerolinecolor": "#EBF0F8"},
+    "yaxis": {"gridcolor": "#EBF0F8", "linecolor": "#EBF0F8", "zerolinecolor": "#EBF0F8"},
+}
+
+
+def typed_array(values, dtype="f4"):
+    """Encode values as a plotly.js typed array spec {dtype, bdata}, with its shape if 2D."""
+    array = np.ascontiguousarray(np.asarray(values, dtype=dtype))
+    spec = {"dtype": array.dtype.str.lstrip("<|="), "bdata": base64.b64encode(array.tobytes()).decode("ascii")}
+    if array.ndim > 1:
+        spec["shape"] = ", ".join(map(str, array.shape))
+    return spec
+
+
+def dates_ms(dates):
+    """Encode dates as milliseconds since the epoch, read as dates by a date axis."""
+    dates = pd.to_datetime(pd.Series(dates))
+    if dates.dt.tz is not None:
+        # keep the wall time, as plotly.js does with ISO strings carrying an offset
+        dates = dates.dt.tz_localize(None)
+    return typed_array(dates.to_numpy(dtype="datetime64[ms]").astype(np.int64), "f8")
+
+
+def encode_series(df):
+    """Encode the date, OHLC and volume columns of df for the browser (see assets/series.js)."""
+    encoded = {"x": dates_ms(df["date"])}
+    for col in ("open", "high", "low", "close", "volume"):
+        if col in df:
+            encoded[col] = typed_array(df[col])
+    return encoded
+
+
+def line(x, y, name, webgl=False, **kwargs):
+    """A line trace, x already encoded by dates_ms."""
+    trace = {"type": "scattergl" if webgl else "scatter", "mode": "lines",
+             "x": x, "y": typed_array(y), "name": name}
+    trace.update(kwargs)
+    return trace
+
+
+def heatmap(z, labels, name=None):
+    """A square heatmap trace of a matrix in [-1, 1], labels on both axes."""
+    return {"type": "heatmap", "z": typed_array(z), "x": labels, "y": labels, "name": name,
+            "zmin": -1, "zmax": 1, "colorscale": "RdBu", "reversescale": True,
+            "hovertemplate": "%{y} / %{x}: %{z:.2f}<extra></extra>"}
+
+
+def figure(traces, layout, xaxis_type="date"):
+    """A figure as a dict, what dcc.Graph sends to plotly.js."""
+    full = {k: dict(v) if isinstance(v, dict) else v for k, v in WHITE_LAYOUT.items()}
+    for key, value in layout.items():
+        if isinstance(value, dict) and isinstance(full.get(key), dict):
+            full[key].update(value)
+        else:
+            full[key] = value
+    full["xaxis"]["type"] = xaxis_type
+    return {"data": traces, "layout": full}
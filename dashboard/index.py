@@ -10,8 +10,15 @@ import dash_bootstrap_components as dbc
 from tabs.tab1 import tab1_layout
 from tabs.tab2 import tab2_layout
 from tabs.tab3 import tab3_layout
+from tabs.tab4 import tab4_layout
+from tabs.tab5 import tab5_layout
+from tabs.tab6 import tab6_layout
+from tabs.tab7 import tab7_layout
 
 from app import app, db
+from symbols import data_version
+import api
+import series
 
 layout = dbc.Container([
     html.H1("Traiding View"),
@@ -25,11 +32,31 @@ layout = dbc.Container([
             dbc.Tab(label="Graphique", tab_id="tab-1"),
             dbc.Tab(label="Tableau", tab_id="tab-2"),
             dbc.Tab(label="SQL", tab_id="tab-3"),
+            dbc.Tab(label="Screener", tab_id="tab-4"),
+            dbc.Tab(label="Corrélations", tab_id="tab-5"),
+            dbc.Tab(label="Backtest", tab_id="tab-6"),
+            dbc.Tab(label="Alertes", tab_id="tab-7"),
         ],
     ),
+    html.Progress(id="series-progress", style={"display": "none"}),
     html.Div(id="tabs-content"),
+
+    # shared by the tabs, kept in the browser session (see assets/series.js)
+    dcc.Store(id="series-store", storage_type="session", data={}),
+    dcc.Store(id="series-request"),
+    dcc.Store(id="ui-store", storage_type="session", data={}),
+    dcc.Store(id="data-version"),
 ])
 
+
+@app.callback(
+    ddep.Output("data-version", "data"),
+    [ddep.Input("tabs-example", "active_tab")],
+)
+def update_data_version(_):
+    # series of an older version are no longer asked for, new keys are fetched
+    return data_version()
+
 @app.callback(
     ddep.Output("tabs-content", "children"),
     [ddep.Input("tabs-example", "active_tab")],
@@ -41,4 +68,12 @@ def render_content(tab):
         return tab2_layout
     elif tab == "tab-3":
         return tab3_layout
+    elif tab == "tab-4":
+        return tab4_layout
+    elif tab == "tab-5":
+        return tab5_layout
+    elif tab == "tab-6":
+        return tab6_layout
+    elif tab == "tab-7":
+        return tab7_layout
 
@@ -0,0 +1,68 @@
+# live.py
+
+"""
+  Rafraîchissement en direct de tab1.
+
+  assets/live.js envoie dans live-request, pour chaque symbole affiché, la
+  date de la dernière ligne de stocks qu'il a déjà ; on ne lit que les lignes
+  plus récentes (index cid, date DESC) et il les ajoute au graphique avec
+  extendData. Un symbole encore sans données reçoit ses LIVE_DAYS derniers
+  jours.
+"""
+
+import os
+
+import pandas as pd
+from dash import Input, Output
+
+from app import app, db
+import figures
+from symbols import get_companies
+
+LIVE_DAYS = 5
+LIVE_INTERVAL = int(os.environ.get("DASHBOARD_LIVE_INTERVAL", 60))  # s, the ETL loads every 10 minutes
+
+
+def fetch_since(since):
+    """New stocks rows per symbol: since maps a symbol to the last date drawn in ms, or None."""
+    companies = get_companies()
+    if companies is None or not since:
+        return {}
+    by_symbol = companies.groupby(companies["symbol"].astype(str).str.strip())["id"].apply(list)
+    parts, params = [], []
+    for symbol, last in since.items():
+        for cid in by_symbol.get(symbol, []):
+            if last is None:
+                parts.append(
+                    "SELECT %s AS symbol, date, value, volume FROM stocks WHERE cid = %s AND date > "
+                    f"(SELECT max(date) FROM stocks WHERE cid = %s) - interval '{LIVE_DAYS} days'"
+                )
+                params.extend([symbol, int(cid), int(cid)])
+            else:
+                # dates travel as UTC epoch ms (see below), whatever the session TimeZone
+                parts.append("SELECT %s AS symbol, date, value, volume FROM stocks "
+                             "WHERE cid = %s AND date > to_timestamp(%s / 1000.0)")
+                params.extend([symbol, int(cid), int(last)])
+    if not parts:
+        return {}
+    df = db.df_query(" UNION ALL ".join(f"({p})" for p in parts) + " ORDER BY symbol, date",
+                     params=tuple(params))
+    if df.empty:
+        return {}
+    # UTC wall time, so that dates_ms gives the epoch ms sent back as since
+    df["date"] = pd.to_datetime(df["date"], utc=True)
+    return {symbol: {"x": figures.dates_ms(rows["date"]), "y": figures.typed_array(rows["value"]),
+                     "volume": figures.typed_array(rows["volume"])}
+            for symbol, rows in df.groupby("symbol")}
+
+
+@app.callback(
+    Output("live-delta", "data"),
+    Input("live-request", "data"),
+    prevent_initial_call=True,
+)
+def fetch_live(request):
+    if not request:
+        return None
+    since = {s: None if request.get("reset") else request["since"].get(s) for s in request["symbols"]}
+    return {"request": request, "series": fetch_since(since)}
@@ -0,0 +1,263 @@
+# metrics.py
+
+"""
+  Mesure de chaque callback du dashboard et profilage à la demande.
+
+  Pour chaque callback on garde, dans ce processus, des histogrammes du temps
+  total de la requête, du temps passé dans la fonction, du temps passé en base
+  (compté par le modèle), du temps de sérialisation (le reste) et de la taille
+  de la réponse. Ils sont servis au format Prometheus sur /metrics.
+
+  Les mesures sont celles du seul worker gunicorn qui répond à /metrics :
+  chaque série porte son pid (étiquette worker), les scrapes successifs
+  tombent sur les différents workers et la somme se fait dans Prometheus
+  (sum by (callback)). La taille est celle de la réponse avant sa
+  compression par flask-compress.
+
+  Avec DASHBOARD_PROFILE=1, /_profile/arm fait échantillonner la pile de la
+  prochaine requête de callback ; /_profile/latest en donne le flamegraph (SVG)
+  et /_profile/latest.txt les piles agrégées.
+
+  Les callbacks en tâche de fond (background=True) tournent dans un autre
+  processus : seules les requêtes de suivi de la tâche sont mesurées ici.
+"""
+
+import functools
+import html
+import os
+import sys
+import threading
+import time
+
+import flask
+
+PROFILE = os.environ.get("DASHBOARD_PROFILE") == "1"
+SAMPLE_INTERVAL = 0.002  # s between two stack samples
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7)
+
+_lock = threading.Lock()
+_histograms = {}  # (metric, callback) -> Histogram
+_current = threading.local()
+_profile = {"armed": False, "stacks": None, "callback": None}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.sum += value
+
+
+def observe(metric, callback, value):
+    buckets = SIZE_BUCKETS if metric.endswith("_bytes") else TIME_BUCKETS
+    with _lock:
+        histogram = _histograms.get((metric, callback))
+        if histogram is None:
+            histogram = _histograms[(metric, callback)] = Histogram(buckets)
+        histogram.observe(value)
+
+
+def render_metrics():
+    """The histograms of this worker in the Prometheus text format."""
+    worker = os.getpid()
+    lines = [f"# histograms of the gunicorn worker {worker} only, response sizes before compression"]
+    with _lock:
+        for metric in sorted({m for m, _ in _histograms}):
+            name = f"dashboard_callback_{metric}"
+            lines.append(f"# TYPE {name} histogram")
+            for (m, callback), h in sorted(_histograms.items()):
+                if m != metric:
+                    continue
+                total = 0
+                for bound, count in zip(h.buckets + ("+Inf",), h.counts):
+                    total += count
+                    lines.append(f'{name}_bucket{{callback="{callback}",worker="{worker}",le="{bound}"}} {total}')
+                lines.append(f'{name}_sum{{callback="{callback}",worker="{worker}"}} {h.sum}')
+                lines.append(f'{name}_count{{callback="{callback}",worker="{worker}"}} {total}')
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------------ profiling --------------------------------
+
+class Sampler(threading.Thread):
+    """Sample the stack of one thread until stopped, as collapsed stacks."""
+
+    def __init__(self, thread_id):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                stack = ";".join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.stacks
+
+
+def flamegraph_svg(stacks, title="", width=1200, row=16):
+    """A minimal flamegraph of collapsed stacks (frame;frame;frame -> samples)."""
+    root = {"name": "all", "count": 0, "children": {}}
+    for stack, count in stacks.items():
+        node = root
+        node["count"] += count
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"name": name, "count": 0, "children": {}})
+            node["count"] += count
+    total = max(root["count"], 1)
+    rects = []
+
+    def draw(node, x, depth):
+        w = node["count"] / total * width
+        if w < 0.5:
+            return
+        rects.append((x, depth, w, node["name"], node["count"]))
+        for child in sorted(node["children"].values(), key=lambda c: c["name"]):
+            draw(child, x, depth + 1)
+            x += child["count"] / total * width
+
+    draw(root, 0.0, 0)
+    depth = max((r[1] for r in rects), default=0) + 1
+    height = (depth + 2) * row
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'font-family="monospace" font-size="11">',
+             f'<text x="4" y="{row - 4}">{html.escape(title)} — {total} samples</text>']
+    for x, d, w, name, count in rects:
+        y = height - (d + 1) * row
+        hue = 20 + (hash(name) % 40)
+        label = html.escape(name)
+        parts.append(
+            f'<g><title>{label} ({count} samples, {100 * count / total:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" fill="hsl({hue},80%,60%)"/>'
+        )
+        if w > 40:
+            parts.append(f'<text x="{x + 3:.1f}" y="{y + row - 5}">{label[:int(w / 7)]}</text>')
+        parts.append("</g>")
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+# ------------------------------ instrumentation --------------------------------
+
+def _db_time(db):
+    """Database time of the thread; 0 while the lazy model of app.py is not built,
+    reading it must not open a connection for a callback that never uses it."""
+    model = getattr(db, "_model", db)
+    return 0.0 if model is None else model.db_time()
+
+
+def _timed(func, db):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _current.callback = name
+        db_before = _db_time(db)
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - t0
+            _current.function_time = elapsed
+            observe("function_seconds", name, elapsed)
+            observe("db_seconds", name, _db_time(db) - db_before)
+
+    return wrapper
+
+
+def instrument(app, db):
+    """Time every callback registered with app.callback from now on and serve the metrics."""
+    register = app.callback
+
+    @functools.wraps(register)
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+
+        def wrap(func):
+            decorator(_timed(func, db))
+            return func
+
+        return wrap
+
+    app.callback = callback
+    server = app.server
+
+    @server.before_request
+    def start_request():
+        if flask.request.path != "/_dash-update-component":
+            return
+        _current.start = time.perf_counter()
+        _current.callback = None
+        _current.function_time = 0.0
+        _current.sampler = None
+        if PROFILE and _profile["armed"]:
+            _profile["armed"] = False
+            _current.sampler = Sampler(threading.get_ident())
+            _current.sampler.start()
+
+    @server.after_request
+    def end_request(response):
+        start = getattr(_current, "start", None)
+        if flask.request.path != "/_dash-update-component" or start is None:
+            return response
+        _current.start = None
+        total = time.perf_counter() - start
+        name = _current.callback or "unknown"
+        observe("request_seconds", name, total)
+        observe("serialization_seconds", name, max(total - _current.function_time, 0.0))
+        # flask-compress has not run yet: the uncompressed size
+        size = response.calculate_content_length()
+        if size is None and not response.direct_passthrough:
+            size = len(response.get_data())
+        observe("response_bytes", name, size or 0)
+        if _current.sampler is not None:
+            _profile["stacks"] = _current.sampler.stop()
+            _profile["callback"] = name
+            _current.sampler = None
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        """Per worker and uncompressed sizes, see the module docstring."""
+        return flask.Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    if not PROFILE:
+        return
+
+    @server.route("/_profile/arm")
+    def profile_arm():
+        _profile["armed"] = True
+        return "The next callback request will be profiled, then see /_profile/latest\n"
+
+    @server.route("/_profile/latest")
+    def profile_latest():
+        if not _profile["stacks"]:
+            return "No profile yet, call /_profile/arm first\n", 404
+        svg = flamegraph_svg(_profile["stacks"], f"callback {_profile['callback']}")
+        return flask.Response(svg, mimetype="image/svg+xml")
+
+    @server.route("/_profile/latest.txt")
+    def profile_latest_txt():
+        stacks = _profile["stacks"] or {}
+        text = "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+        return flask.Response(text, mimetype="text/plain")
@@ -0,0 +1,96 @@
+# screener.py
+
+"""
+  Screener sur toutes les sociétés.
+
+  Les indicateurs (variation, volatilité réalisée, pic de volume, distance au
+  plus haut sur 52 semaines) sont calculés en une fois avec NumPy sur la
+  matrice sociétés x jours de universe.py, sans requête par symbole. Le
+  tableau complet est mis en cache par (version des données, fenêtre, date) ;
+  trier et couper selon le critère ne coûte ensuite presque rien.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import cache
+from universe import get_cube, cache_version, forward_fill, company_labels
+
+YEAR_DAYS = 252  # trading days in 52 weeks
+STALE_DAYS = 5  # a company without a close in the last STALE_DAYS days is left out
+RESULT_TTL = 24 * 3600
+
+# criterion -> (label, column, descending)
+CRITERIA = {
+    "gainers": ("Plus fortes hausses", "change", True),
+    "losers": ("Plus fortes baisses", "change", False),
+    "volatility": ("Volatilité réalisée", "volatility", True),
+    "volume_spike": ("Pics de volume", "volume_spike", True),
+    "high_52w": ("Plus hauts sur 52 semaines", "high_52w", True),
+}
+
+
+def compute_metrics(cube, window=20, as_of=None):
+    """All the indicators for every company of the cube, as a DataFrame."""
+    hi = cube.day_range(None, as_of).stop
+    if hi < 2:
+        return pd.DataFrame()
+    start, end = cube.days[max(0, hi - max(window, YEAR_DAYS) - 1)], cube.days[hi - 1]
+    close_raw, _ = cube.matrix("close", None, start, end)
+    high, _ = cube.matrix("high", None, start, end)
+    volume, _ = cube.matrix("volume", None, start, end)
+    close = forward_fill(close_raw)
+    n = close.shape[1]
+    w = min(window, n - 1)
+
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # all-NaN rows
+        last = close[:, -1]
+        change = last / close[:, -1 - w] - 1
+        returns = np.diff(np.log(close[:, -1 - w:]), axis=1)
+        volatility = np.nanstd(returns, axis=1, ddof=1) * np.sqrt(YEAR_DAYS)
+        volume_spike = volume[:, -1] / np.nanmean(volume[:, -1 - w:-1], axis=1)
+        high_52w = last / np.nanmax(high[:, -YEAR_DAYS:], axis=1)
+    alive = ~np.isnan(close_raw[:, -STALE_DAYS:]).all(axis=1)
+
+    symbols, names = company_labels(cube.cids)
+    df = pd.DataFrame({
+        "date": str(end),
+        "symbol": symbols,
+        "name": names,
+        "close": last,
+        "change": change,
+        "volatility": volatility,
+        "volume": volume[:, -1],
+        "volume_spike": volume_spike,
+        "high_52w": high_52w,
+    })
+    df = df[alive & (df["symbol"] != "")]
+    return df.replace([np.inf, -np.inf], np.nan).reset_index(drop=True)
+
+
+def metrics(window=20, as_of=None):
+    """compute_metrics on the current cube, cached per data version."""
+    as_of = str(pd.Timestamp(as_of).date()) if as_of else None
+    key = f"screener:{cache_version()}:{window}:{as_of}"
+
+    def compute():
+        cube = get_cube()
+        return None if cube is None else compute_metrics(cube, window, as_of)
+
+    return cache.get_or_compute(key, compute, ttl=RESULT_TTL)
+
+
+def screen(criterion="gainers", window=20, as_of=None, limit=50, min_volume=0):
+    """The limit best companies for criterion, as a DataFrame."""
+    _, column, descending = CRITERIA[criterion]
+    df = metrics(window, as_of)
+    if df is None or df.empty:
+        return pd.DataFrame()
+    if min_volume:
+        df = df[df["volume"] >= min_volume]
+    df = df.dropna(subset=[column])
+    df = df.nlargest(limit, column) if descending else df.nsmallest(limit, column)
+    return df.reset_index(drop=True)
@@ -0,0 +1,79 @@
+# series.py
+
+"""
+  Séries journalières demandées par les onglets et rangées dans le navigateur.
+
+  assets/series.js calcule les clés symbole|début|fin|version absentes de
+  series-store et les envoie dans series-request ; on ne lit que celles-là
+  dans daystocks et on les ajoute au store avec un Patch, sans renvoyer ce
+  que le navigateur a déjà.
+"""
+
+import os
+
+import pandas as pd
+from dash import Input, Output, Patch, no_update
+
+from app import app, db
+import figures
+from pricecube import current_cube
+from symbols import data_version, get_companies
+
+PRICE_CUBE_DIR = os.environ.get("PRICE_CUBE_DIR", "/home/bourse/data/cube")
+
+
+def price_cube():
+    """The price cube built by the ETL if it matches the current data version, else None."""
+    cube = current_cube(PRICE_CUBE_DIR)
+    if cube is None or cube.version != str(data_version()):
+        return None
+    return cube
+
+
+def fetch_daily(symbol, start_date, end_date):
+    """Return the daystocks rows of symbol between the two dates."""
+    cube = price_cube()
+    companies = get_companies()
+    if cube is not None and companies is not None:
+        cids = companies.loc[companies["symbol"].astype(str).str.strip() == symbol, "id"]
+        if len(cids):
+            frames = [cube.series(cid, start_date, end_date) for cid in cids]
+            return pd.concat(frames, ignore_index=True).sort_values("date", ignore_index=True)
+    return db.df_query(
+        """
+        SELECT ds.date, ds.open, ds.high, ds.low, ds.close, ds.volume
+        FROM daystocks ds
+        JOIN companies c ON ds.cid = c.id
+        WHERE c.symbol = %s
+            AND ds.date >= %s
+            AND ds.date <= %s
+        ORDER BY ds.date;
+        """,
+        params=(symbol, start_date, end_date), parse_dates=["date"]
+    )
+
+
+# a background job: a long range does not hold a gunicorn thread, and a new
+# request (the user changed the symbols or the dates) cancels the running one
+@app.callback(
+    Output("series-store", "data"),
+    Input("series-request", "data"),
+    background=True,
+    progress=[Output("series-progress", "value"), Output("series-progress", "max")],
+    running=[(Output("series-progress", "style"), {"width": "100%"}, {"display": "none"})],
+    prevent_initial_call=True,
+)
+def fetch_series(set_progress, request):
+    if not request or not request.get("items"):
+        return no_update
+
+    store = Patch()
+    for key in request.get("evict", []):
+        del store[key]
+    items = request["items"]
+    for i, item in enumerate(items):
+        set_progress((str(i), str(len(items))))
+        df = fetch_daily(item["symbol"], item["start"], item["end"])
+        # an empty series is stored too, so that it is not asked again
+        store[item["key"]] = figures.encode_series(df) if not df.empty else None
+    return store
@@ -0,0 +1,198 @@
+# symbols.py
+
+"""
+  Copie en mémoire de la liste des sociétés qui ont des données.
+
+  La liste vient de la table active_companies maintenue par l'ETL. Elle n'est
+  relue que lorsque la version des données (tag data_version) change, et la
+  version elle-même n'est vérifiée qu'au plus une fois toutes les VERSION_TTL
+  secondes.
+
+  Un index en mémoire (préfixes et trigrammes sur symbole, nom et ISIN) permet
+  de ne renvoyer au navigateur que les meilleures correspondances d'une saisie.
+"""
+
+import bisect
+import re
+import threading
+import time
+
+from app import db
+
+VERSION_TTL = 30  # seconds between two checks of the data version
+SEARCH_LIMIT = 20  # number of options sent to a dropdown for a search
+
+_WORD_REGEX = re.compile(r"[\w]+")
+
+_lock = threading.Lock()
+_cache = {
+    "version": None,
+    "checked_at": 0.0,
+    "loaded": False,
+    "loaded_version": None,
+    "companies": None,
+    "options": [],
+    "index": None,
+}
+
+
+class SymbolIndex:
+    """Prefix and trigram index over the symbol, name and ISIN of companies.
+
+    Prefix matches on the symbol, the ISIN or any word of the name come first,
+    then trigram matches so that a typo or a substring still finds something.
+    """
+
+    def __init__(self, options, isins=None):
+        self.options = options
+        isins = isins or [""] * len(options)
+        keys = []  # (token, rank, position), rank orders the kind of match
+        self.trigrams = {}
+        for pos, (option, isin) in enumerate(zip(options, isins)):
+            symbol = option["value"].lower()
+            name = option["label"].split(" – ", 1)[-1].lower()
+            isin = (isin or "").strip().lower()
+            keys.append((symbol, 0, pos))
+            if isin:
+                keys.append((isin, 1, pos))
+            for word in _WORD_REGEX.findall(name):
+                keys.append((word, 2, pos))
+            for tri in self._trigrams(f"{symbol} {name} {isin}"):
+                self.trigrams.setdefault(tri, set()).add(pos)
+        keys.sort()
+        self.tokens = [k[0] for k in keys]
+        self.keys = keys
+
+    @staticmethod
+    def _trigrams(text):
+        text = f"  {text} "
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Return the best matching options for query, at most limit of them."""
+        query = query.strip().lower()
+        if not query:
+            return self.options[:limit]
+        scores = {}
+        # prefix matches, the whole query is a prefix of a token
+        start = bisect.bisect_left(self.tokens, query)
+        for token, rank, pos in self.keys[start:]:
+            if not token.startswith(query):
+                break
+            score = rank - 1 if token == query and rank == 0 else rank
+            scores[pos] = min(scores.get(pos, score), score)
+        # trigram matches for the rest
+        if len(scores) < limit and len(query) >= 3:
+            tris = {query[i:i + 3] for i in range(len(query) - 2)}
+            counts = {}
+            for tri in tris:
+                for pos in self.trigrams.get(tri, ()):
+                    counts[pos] = counts.get(pos, 0) + 1
+            needed = max(1, len(tris) * 2 // 3)
+            for pos, count in counts.items():
+                if count >= needed and pos not in scores:
+                    scores[pos] = 4 - count / len(tris)
+        best = sorted(scores, key=lambda pos: (scores[pos], self.options[pos]["value"]))
+        return [self.options[pos] for pos in best[:limit]]
+
+
+def _load_companies(version):
+    if version is None:
+        # the ETL never refreshed active_companies, fall back on the live query
+        return db.df_query(
+            """
+            SELECT DISTINCT c.id, c.symbol, c.name, c.isin
+            FROM companies c
+            WHERE c.symbol IS NOT NULL AND c.symbol != ''
+              AND c.id IN (
+                SELECT cid FROM daystocks
+                UNION
+                SELECT cid FROM stocks
+              )
+            ORDER BY c.symbol
+            """
+        )
+    return db.df_query(
+        """
+        SELECT cid AS id, symbol, name, isin, first_date, last_date, nb_daystocks, nb_stocks
+        FROM active_companies
+        ORDER BY symbol
+        """
+    )
+
+
+def _build_options(comp_df):
+    options = []
+    for symbol, name in zip(comp_df["symbol"], comp_df["name"]):
+        symbol = str(symbol).strip()
+        name = str(name).strip()
+
+        if symbol and name and symbol.lower() != "none" and name.lower() != "none":
+            options.append({
+                "label": f"{symbol} – {name}",
+                "value": symbol
+            })
+    return options
+
+
+def data_version():
+    """Return the current data version, checked at most every VERSION_TTL seconds."""
+    now = time.monotonic()
+    if now - _cache["checked_at"] >= VERSION_TTL:
+        _cache["version"] = db.get_data_version()
+        _cache["checked_at"] = now
+    return _cache["version"]
+
+
+def _refresh():
+    with _lock:
+        version = data_version()
+        if _cache["loaded"] and _cache["loaded_version"] == version:
+            return
+        comp_df = _load_companies(version)
+        if comp_df.empty:
+            return  # keep the previous copy, the database may be restarting
+        _cache["companies"] = comp_df
+        _cache["options"] = _build_options(comp_df)
+        isins = dict(zip(comp_df["symbol"].astype(str).str.strip(), comp_df["isin"]))
+        _cache["index"] = SymbolIndex(_cache["options"],
+                                      [isins.get(o["value"]) for o in _cache["options"]])
+        _cache["loaded_version"] = version
+        _cache["loaded"] = True
+
+
+def get_companies():
+    """Return the active companies as a DataFrame (id, symbol, name, isin, ...)."""
+    _refresh()
+    return _cache["companies"]
+
+
+def get_symbol_options():
+    """Return the dropdown options of the active companies."""
+    _refresh()
+    return _cache["options"]
+
+
+def search_symbol_options(query, selected=None, limit=SEARCH_LIMIT):
+    """Return the options matching query plus the already selected ones.
+
+    A dropdown drops the values that are not in its options, so the selected
+    symbols are always sent back with the matches.
+    """
+    _refresh()
+    index = _cache["index"]
+    if index is None:
+        return []
+    if isinstance(selected, str):
+        selected = [selected]
+    selected = [s for s in (selected or []) if s]
+    matches = index.search(query or "", limit)
+    if query:
+        # the dropdown filters its options again on the browser side, the query
+        # is added to the searched text so that ISIN and fuzzy matches survive
+        matches = [dict(o, search=f"{o['label']} {query}") for o in matches]
+    if selected:
+        by_value = {o["value"]: o for o in _cache["options"]}
+        kept = [by_value.get(s, {"label": s, "value": s}) for s in selected]
+        matches = kept + [o for o in matches if o["value"] not in selected]
+    return matches
@@ -2,41 +2,13 @@
 
 import datetime
 from dash import html, dcc
-from dash.dependencies import Input, Output, State
-import plotly.graph_objects as go
-import pandas as pd
-import plotly.colors as pc
+from dash.dependencies import Input, Output, State, ClientsideFunction
 
-from app import app, db
+from app import app
+from symbols import search_symbol_options
+from live import LIVE_INTERVAL
 
 
-_comp_df = db.df_query(
-    """
-    SELECT DISTINCT c.id, c.symbol, c.name
-    FROM companies c
-    WHERE c.symbol IS NOT NULL AND c.symbol != ''
-      AND c.id IN (
-        SELECT cid FROM daystocks
-        UNION
-        SELECT cid FROM stocks
-      )
-    ORDER BY c.symbol
-    """
-)
-
-colors = pc.qualitative.Plotly 
-_symbol_options = []
-
-for _, row in _comp_df.iterrows():
-    symbol = str(row.symbol).strip()
-    name = str(row.name).strip()
-
-    if symbol and name and symbol.lower() != "none" and name.lower() != "none":
-        _symbol_options.append({
-            "label": f"{symbol} – {name}",
-            "value": symbol
-        })
-
 
 
 tab1_layout = html.Div([
@@ -51,7 +23,7 @@ tab1_layout = html.Div([
                     id="symbol-dropdown",
                     options= [],
                     value=[],
-                    placeholder="Sélectionnez une action",
+                    placeholder="Symbole, nom ou ISIN",
                     multi=True,
                     clearable=False,
                     style={"minWidth": "200px"}
@@ -107,18 +79,32 @@ tab1_layout = html.Div([
                     value="linear",
                     inline=True
                 )
+            ], style={"marginRight": "2rem"}),
+
+            html.Div([
+                html.Label("Rafraîchissement"),
+                dcc.Checklist(
+                    id="live-refresh",
+                    options=[{"label": "Temps réel", "value": "live"}],
+                    value=[],
+                    inline=True,
+                )
             ]),
 
         ]
     ),
 
     html.Hr(),
-    dcc.Graph(id="price-chart", config={"displayModeBar": True})
+    dcc.Graph(id="price-chart", config={"displayModeBar": True}),
+    dcc.Interval(id="live-interval", interval=LIVE_INTERVAL * 1000),
+    dcc.Store(id="live-request"),
+    dcc.Store(id="live-delta"),
+    dcc.Store(id="live-state"),
 ])
 
 
 @app.callback(
-    Output("symbol-dropdown", "value"),
+    Output("symbol-dropdown", "value", allow_duplicate=True),
     Input("price-chart", "restyleData"),
     State("symbol-dropdown", "value"),
     prevent_initial_call=True
@@ -139,195 +125,97 @@ def update_dropdown_from_legend(restyle_data, selected_symbols):
     new_selection = [s for s in selected_symbols if s not in symbols_to_remove]
     return new_selection
 
-@app.callback(
+# only the missing series are asked to the server (series.fetch_series)
+app.clientside_callback(
+    ClientsideFunction(namespace="series", function_name="request"),
+    Output("series-request", "data"),
+    [
+        Input("symbol-dropdown", "value"),
+        Input("date-picker-range", "start_date"),
+        Input("date-picker-range", "end_date"),
+        Input("data-version", "data"),
+    ],
+    State("series-store", "data"),
+)
+
+
+# chart type, Y scale and indicators are presentation only: applied in the
+# browser (assets/charts.js) to the data already held in series-store
+app.clientside_callback(
+    ClientsideFunction(namespace="charts", function_name="renderFromStore"),
     Output("price-chart", "figure"),
     [
+        Input("series-store", "data"),
         Input("symbol-dropdown", "value"),
         Input("date-picker-range", "start_date"),
         Input("date-picker-range", "end_date"),
+        Input("data-version", "data"),
         Input("chart-type", "value"),
         Input("yaxis-type", "value"),
         Input("technical-indicators", "value"),
+        Input("live-refresh", "value"),
     ],
 )
-def update_price_chart(symbols, start_date, end_date, chart_type, yaxis_type, technical_indicators):
-
-    if not symbols or not start_date or not end_date:
-        return go.Figure()
-
-    fig = go.Figure()
-
-    for symbol in symbols:
-        q = f"""
-        SELECT ds.date, ds.open, ds.high, ds.low, ds.close
-        FROM daystocks ds
-        JOIN companies c ON ds.cid = c.id
-        WHERE c.symbol = '{symbol}'
-            AND ds.date >= '{start_date}'
-            AND ds.date <= '{end_date}'
-        ORDER BY ds.date;
-        """
-        df = db.df_query(q, parse_dates=["date"])
-
-        if df.empty:
-            continue
-
-        if chart_type == "line":
-            fig.add_trace(go.Scatter(
-                x=df["date"],
-                y=df["close"],
-                mode="lines",
-                name=symbol,
-            ))
-
-        elif chart_type == "candlestick":
-            fig.add_trace(go.Candlestick(
-                x=df["date"],
-                open=df["open"],
-                high=df["high"],
-                low=df["low"],
-                close=df["close"],
-                name=symbol,
-            ))
 
-        elif chart_type == "bollinger":
-            window = 20 
-            if len(df) >= window:
-                df['rolling_mean'] = df['close'].rolling(window=window).mean()
-                df['rolling_std'] = df['close'].rolling(window=window).std()
-                df['upper_band'] = df['rolling_mean'] + (2 * df['rolling_std'])
-                df['lower_band'] = df['rolling_mean'] - (2 * df['rolling_std'])
 
-                color = colors[symbols.index(symbol) % len(colors)]
-                legend_group_name = f"bollinger_{symbol}"
-
-                fig.add_trace(go.Scatter(
-                    x=df["date"],
-                    y=df["rolling_mean"],
-                    mode="lines",
-                    line=dict(color=color, dash="dash"),
-                    name=symbol,
-                    legendgroup=legend_group_name,
-                    showlegend=True
-                ))
-
-                fig.add_trace(go.Scatter(
-                    x=df["date"],
-                    y=df["upper_band"],
-                    mode="lines",
-                    line=dict(color=color, width=0.5),
-                    name=f"{symbol} - Upper",
-                    legendgroup=legend_group_name,
-                    showlegend=False
-                ))
-
-                fig.add_trace(go.Scatter(
-                    x=df["date"],
-                    y=df["lower_band"],
-                    mode="lines",
-                    line=dict(color=color, width=0.5),
-                    name=f"{symbol} - Lower",
-                    legendgroup=legend_group_name,
-                    fill='tonexty',
-                    fillcolor='rgba(0,0,0,0)',
-                    showlegend=False
-                ))
-
-                fig.add_trace(go.Scatter(
-                    x=df["date"],
-                    y=df["close"],
-                    mode="lines",
-                    line=dict(color=color, width=1, dash="dot"),
-                    name=f"{symbol} - Close",
-                    legendgroup=legend_group_name,
-                    showlegend=False
-                ))
-        if "sma20" in technical_indicators and len(df) >= 20:
-            df["SMA20"] = df["close"].rolling(window=20).mean()
-            fig.add_trace(go.Scatter(
-                x=df["date"],
-                y=df["SMA20"],
-                mode="lines",
-                line=dict(dash="dash", color="blue"),
-                name=f"{symbol} - SMA20"
-            ))
-
-        if "ema20" in technical_indicators and len(df) >= 20:
-            df["EMA20"] = df["close"].ewm(span=20, adjust=False).mean()
-            fig.add_trace(go.Scatter(
-                x=df["date"],
-                y=df["EMA20"],
-                mode="lines",
-                line=dict(dash="dot", color="green"),
-                name=f"{symbol} - EMA20"
-            ))
-
-        if "rsi14" in technical_indicators and len(df) >= 14:
-            delta = df["close"].diff()
-            gain = delta.where(delta > 0, 0)
-            loss = -delta.where(delta < 0, 0)
-            avg_gain = gain.rolling(window=14).mean()
-            avg_loss = loss.rolling(window=14).mean()
-            rs = avg_gain / avg_loss
-            df["RSI"] = 100 - (100 / (1 + rs))
-            fig.add_trace(go.Scatter(
-                x=df["date"],
-                y=df["RSI"],
-                mode="lines",
-                line=dict(color="red"),
-                name=f"{symbol} - RSI14"
-            ))
+# live mode: only the stocks rows newer than the drawn ones are fetched
+# (live.fetch_live) and appended with extendData (assets/live.js)
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="request"),
+    Output("live-request", "data"),
+    [
+        Input("live-interval", "n_intervals"),
+        Input("live-refresh", "value"),
+        Input("symbol-dropdown", "value"),
+        Input("chart-type", "value"),
+        Input("yaxis-type", "value"),
+        Input("technical-indicators", "value"),
+    ],
+    State("live-state", "data"),
+)
 
-    fig.update_layout(
-        title={
-            'text': (
-                f"Évolution des actions sélectionnées<br>"
-                f"<sub>Astuce: cliquez sur une action dans la légende pour l'afficher/masquer</sub>"
-            ),
-            'x': 0.5,
-            'xanchor': 'center'
-        },
-        xaxis_title="Date",
-        yaxis_title="Prix",
-        margin={"l": 40, "r": 20, "t": 70, "b": 40},
-        template="plotly_white",
-        yaxis_type=yaxis_type,
-        legend_title="Actions",
-        showlegend=True
-    )
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="apply"),
+    [
+        Output("price-chart", "figure", allow_duplicate=True),
+        Output("price-chart", "extendData"),
+        Output("live-state", "data"),
+    ],
+    Input("live-delta", "data"),
+    State("live-state", "data"),
+    prevent_initial_call=True,
+)
 
 
+# the selection survives tab switches
+app.clientside_callback(
+    ClientsideFunction(namespace="series", function_name="restoreSymbols"),
+    [
+        Output("symbol-dropdown", "value"),
+        Output("date-picker-range", "start_date"),
+        Output("date-picker-range", "end_date"),
+    ],
+    Input("symbol-dropdown", "id"),
+    State("ui-store", "data"),
+)
 
-    return fig
+app.clientside_callback(
+    ClientsideFunction(namespace="series", function_name="saveSymbols"),
+    Output("ui-store", "data", allow_duplicate=True),
+    [
+        Input("symbol-dropdown", "value"),
+        Input("date-picker-range", "start_date"),
+        Input("date-picker-range", "end_date"),
+    ],
+    State("ui-store", "data"),
+    prevent_initial_call=True,
+)
 
 
 @app.callback(
     Output('symbol-dropdown', 'options'),
-    Input('symbol-dropdown', 'id'),
+    Input('symbol-dropdown', 'search_value'),
+    Input('symbol-dropdown', 'value'),
 )
-def load_dropdown_options(_):
-    _comp_df = db.df_query(
-        """
-        SELECT DISTINCT c.id, c.symbol, c.name
-        FROM companies c
-        WHERE c.symbol IS NOT NULL AND c.symbol != ''
-          AND c.id IN (
-            SELECT cid FROM daystocks
-            UNION
-            SELECT cid FROM stocks
-          )
-        ORDER BY c.symbol
-        """
-    )
-
-    options = []
-    for _, row in _comp_df.iterrows():
-        symbol = str(row.symbol).strip()
-        name = str(row.name).strip()
-
-        if symbol and name and symbol.lower() != "none" and name.lower() != "none":
-            options.append({
-                "label": f"{symbol} – {name}",
-                "value": symbol
-            })
-    return options
\ No newline at end of file
+def load_dropdown_options(search_value, selected_symbols):
+    return search_symbol_options(search_value, selected_symbols)
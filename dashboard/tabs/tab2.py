@@ -2,35 +2,12 @@
 
 import pandas as pd
 import datetime
-from dash import dcc, html, callback, Output, Input
+from dash import dcc, html, Output, Input, State, ClientsideFunction, no_update
 import dash_bootstrap_components as dbc
+import dash_ag_grid as dag
 
 from app import app, db
-
-_comp_df = db.df_query(
-    """
-    SELECT DISTINCT c.id, c.symbol, c.name
-    FROM companies c
-    WHERE c.symbol IS NOT NULL AND c.symbol != ''
-      AND c.id IN (
-        SELECT cid FROM daystocks
-        UNION
-        SELECT cid FROM stocks
-      )
-    ORDER BY c.symbol
-    """
-)
-
-_symbol_options = []
-for _, row in _comp_df.iterrows():
-    symbol = str(row.symbol).strip()
-    name = str(row.name).strip()
-
-    if symbol and name and symbol.lower() != "none" and name.lower() != "none":
-        _symbol_options.append({
-            "label": f"{symbol} – {name}",
-            "value": symbol
-        })
+from symbols import search_symbol_options
 
 tab2_layout = html.Div([
     html.Div([
@@ -42,7 +19,7 @@ tab2_layout = html.Div([
                     id='tab2-symbol-dropdown',
                     options=[],
                     multi=False,
-                    placeholder="Choisir une action",
+                    placeholder="Choisir une action (symbole, nom ou ISIN)",
                     clearable=False,
                 )
 
@@ -59,50 +36,149 @@ tab2_layout = html.Div([
             ], width=6)
         ], className="mb-4"),
         
-        html.Div(id='tab2-table-container')
+        html.Div(id='tab2-table-container'),
+        dcc.Store(id='tab2-rows-request'),
     ]),
 ])
 
-def generate_html_table(df: pd.DataFrame):
-    """Create a full HTML table from a DataFrame, formatted in French"""
-
-    rename_columns = {
-        "symbol": "Action",
-        "date": "Date",
-        "open": "Ouverture",
-        "high": "Haut",
-        "low": "Bas",
-        "close": "Clôture",
-        "volume": "Volume",
-        "écart_type": "Écart type"
-    }
-    df_display = df.rename(columns=rename_columns)
-
-    if "Écart type" in df_display.columns:
-        df_display["Écart type"] = df_display["Écart type"].round(2)
-    if "Date" in df_display.columns:
-        df_display["Date"] = pd.to_datetime(df_display["Date"]).dt.date
-
-    return html.Div([
-        html.Table([
-            html.Thead(html.Tr([html.Th(col) for col in df_display.columns])),
-            html.Tbody([
-                html.Tr([
-                    html.Td(df_display.iloc[i][col]) for col in df_display.columns
-                ]) for i in range(len(df_display))
-            ])
-        ], style={
-            "width": "100%",
-            "borderCollapse": "collapse",
-            "border": "1px solid black"
-        })
-    ], style={
-        "maxHeight": "500px",
-        "overflowY": "scroll",
-        "display": "block",
-        "border": "1px solid grey",
-        "padding": "5px"
-    })
+PAGE_SIZE = 100
+
+# colonnes affichées : nom SQL -> (titre, type de filtre)
+COLUMNS = {
+    "symbol": ("Action", None),
+    "date": ("Date", "agDateColumnFilter"),
+    "open": ("Ouverture", "agNumberColumnFilter"),
+    "high": ("Haut", "agNumberColumnFilter"),
+    "low": ("Bas", "agNumberColumnFilter"),
+    "close": ("Clôture", "agNumberColumnFilter"),
+    "volume": ("Volume", "agNumberColumnFilter"),
+    "ecart_type": ("Écart type", "agNumberColumnFilter"),
+}
+
+_NUMBER_OPERATORS = {
+    "equals": "=",
+    "notEqual": "<>",
+    "lessThan": "<",
+    "lessThanOrEqual": "<=",
+    "greaterThan": ">",
+    "greaterThanOrEqual": ">=",
+}
+
+
+def generate_grid():
+    """Create an AG Grid whose rows are fetched page by page from the server"""
+    column_defs = []
+    for col, (header, filter_type) in COLUMNS.items():
+        column_def = {"field": col, "headerName": header, "sortable": col != "symbol"}
+        if filter_type:
+            column_def["filter"] = filter_type
+            column_def["filterParams"] = {"maxNumConditions": 2, "buttons": ["reset"]}
+        if col == "ecart_type":
+            column_def["valueFormatter"] = {"function": "params.value == null ? '' : d3.format('.2f')(params.value)"}
+        column_defs.append(column_def)
+
+    return dag.AgGrid(
+        id="tab2-grid",
+        rowModelType="infinite",
+        columnDefs=column_defs,
+        defaultColDef={"flex": 1, "minWidth": 100, "resizable": True},
+        dashGridOptions={
+            "pagination": True,
+            "paginationPageSize": PAGE_SIZE,
+            "cacheBlockSize": PAGE_SIZE,
+            "maxBlocksInCache": 5,
+            "rowBuffer": 0,
+        },
+        style={"height": "500px"},
+    )
+
+
+def _condition_sql(col, condition):
+    """Translate one AG Grid filter condition into SQL and its parameters"""
+    kind = condition.get("type")
+    if condition.get("filterType") == "date":
+        value, value_to = condition.get("dateFrom"), condition.get("dateTo")
+        column = f"{col}::date"
+        if value:
+            value = value[:10]
+        if value_to:
+            value_to = value_to[:10]
+    else:
+        value, value_to = condition.get("filter"), condition.get("filterTo")
+        column = col
+    if kind == "inRange":
+        return f"{column} BETWEEN %s AND %s", [value, value_to]
+    if kind == "blank":
+        return f"{column} IS NULL", []
+    if kind == "notBlank":
+        return f"{column} IS NOT NULL", []
+    if kind in _NUMBER_OPERATORS:
+        return f"{column} {_NUMBER_OPERATORS[kind]} %s", [value]
+    return None, []
+
+
+def _filter_sql(filter_model):
+    """Translate the AG Grid filter model into a WHERE clause"""
+    clauses, params = [], []
+    for col, model in (filter_model or {}).items():
+        if col not in COLUMNS:
+            continue
+        conditions = model.get("conditions") or [model]
+        operator = " OR " if model.get("operator") == "OR" else " AND "
+        parts = []
+        for condition in conditions:
+            sql, values = _condition_sql(col, condition)
+            if sql:
+                parts.append(sql)
+                params.extend(values)
+        if parts:
+            clauses.append("(" + operator.join(parts) + ")")
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _order_sql(sort_model):
+    """Translate the AG Grid sort model into an ORDER BY clause"""
+    orders = []
+    for sort in sort_model or []:
+        col = sort.get("colId")
+        if col in COLUMNS:
+            orders.append(f"{col} {'DESC' if sort.get('sort') == 'desc' else 'ASC'}")
+    return " ORDER BY " + ", ".join(orders or ["date ASC"])
+
+
+def fetch_page(symbol, start_date, end_date, start_row, end_row, sort_model=None, filter_model=None):
+    """Return one page of daystocks rows and the number of rows matching the filters"""
+    where, filter_params = _filter_sql(filter_model)
+    query = """
+        WITH data AS (
+            SELECT c.symbol, s.date, s.open, s.high, s.low, s.close, s.volume,
+                   STDDEV_SAMP(s.close) OVER (ORDER BY s.date ROWS BETWEEN 3 PRECEDING AND 3 FOLLOWING) AS ecart_type
+            FROM daystocks s
+            JOIN companies c ON s.cid = c.id
+            WHERE c.symbol = %s
+    """
+    params = [symbol]
+
+    if start_date and end_date:
+        query += " AND s.date BETWEEN %s AND %s"
+        params.extend([start_date, end_date])
+
+    query += f"""
+        )
+        SELECT *, COUNT(*) OVER () AS total
+        FROM data{where}{_order_sql(sort_model)}
+        LIMIT %s OFFSET %s
+    """
+    params.extend(filter_params)
+    params.extend([end_row - start_row, start_row])
+
+    df = db.df_query(query, params=tuple(params))
+    if df.empty:
+        return df, start_row
+    total = int(df["total"].iloc[0])
+    df = df.drop(columns=["total"])
+    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+    return df, total
 
 
 @app.callback(
@@ -118,58 +194,76 @@ def update_table(selected_symbol, start_date, end_date):
     if not selected_symbol:
         return html.P("Veuillez sélectionner une action.")
 
-    query = """
-        SELECT c.symbol, s.date, s.open, s.high, s.low, s.close, s.volume
-        FROM daystocks s
-        JOIN companies c ON s.cid = c.id
-        WHERE c.symbol = %s
-    """
-    params = [selected_symbol]
+    # a new grid resets its row cache and asks again for its first page
+    return generate_grid()
 
-    if start_date and end_date:
-        query += " AND s.date BETWEEN %s AND %s"
-        params.extend([start_date, end_date])
 
-    query += " ORDER BY s.date ASC"
+# pages are cut from series-store when tab1 already fetched the series,
+# otherwise the request goes on to load_rows
+app.clientside_callback(
+    ClientsideFunction(namespace="series", function_name="gridRows"),
+    [
+        Output('tab2-grid', 'getRowsResponse'),
+        Output('tab2-rows-request', 'data'),
+    ],
+    Input('tab2-grid', 'getRowsRequest'),
+    State('series-store', 'data'),
+    State('tab2-symbol-dropdown', 'value'),
+    State('tab2-date-picker', 'start_date'),
+    State('tab2-date-picker', 'end_date'),
+    State('data-version', 'data'),
+)
 
-    df = db.df_query(query, params=tuple(params))
 
-    if df.empty:
-        return html.P("Aucune donnée disponible pour cette sélection.")
-    df['écart_type'] = df['close'].rolling(window=7, center=True, min_periods=1).std()
+@app.callback(
+    Output('tab2-grid', 'getRowsResponse', allow_duplicate=True),
+    Input('tab2-rows-request', 'data'),
+    State('tab2-symbol-dropdown', 'value'),
+    State('tab2-date-picker', 'start_date'),
+    State('tab2-date-picker', 'end_date'),
+    prevent_initial_call=True,
+)
+def load_rows(request, selected_symbol, start_date, end_date):
+    if not request or not selected_symbol:
+        return no_update
+
+    start_row = request.get("startRow", 0)
+    end_row = request.get("endRow", start_row + PAGE_SIZE)
+    df, total = fetch_page(selected_symbol, start_date, end_date, start_row, end_row,
+                           request.get("sortModel"), request.get("filterModel"))
 
-    return generate_html_table(df)
+    return {"rowData": df.to_dict("records"), "rowCount": total}
 
 
 @app.callback(
     Output('tab2-symbol-dropdown', 'options'),
-    Input('tab2-symbol-dropdown', 'id'),  # dummy input just to trigger on page load
+    Input('tab2-symbol-dropdown', 'search_value'),
+    Input('tab2-symbol-dropdown', 'value'),
 )
-def load_dropdown_options(_):
-    _comp_df = db.df_query(
-        """
-        SELECT DISTINCT c.id, c.symbol, c.name
-        FROM companies c
-        WHERE c.symbol IS NOT NULL AND c.symbol != ''
-          AND c.id IN (
-            SELECT cid FROM daystocks
-            UNION
-            SELECT cid FROM stocks
-          )
-        ORDER BY c.symbol
-        """
-    )
-
-    options = []
-    for _, row in _comp_df.iterrows():
-        symbol = str(row.symbol).strip()
-        name = str(row.name).strip()
+def load_dropdown_options(search_value, selected_symbol):
+    return search_symbol_options(search_value, selected_symbol)
 
-        if symbol and name and symbol.lower() != "none" and name.lower() != "none":
-            options.append({
-                "label": f"{symbol} – {name}",
-                "value": symbol
-            })
-    return options
 
+# the selection survives tab switches
+app.clientside_callback(
+    ClientsideFunction(namespace="series", function_name="restoreSymbol"),
+    [
+        Output('tab2-symbol-dropdown', 'value'),
+        Output('tab2-date-picker', 'start_date'),
+        Output('tab2-date-picker', 'end_date'),
+    ],
+    Input('tab2-symbol-dropdown', 'id'),
+    State('ui-store', 'data'),
+)
 
+app.clientside_callback(
+    ClientsideFunction(namespace="series", function_name="saveSymbol"),
+    Output('ui-store', 'data', allow_duplicate=True),
+    [
+        Input('tab2-symbol-dropdown', 'value'),
+        Input('tab2-date-picker', 'start_date'),
+        Input('tab2-date-picker', 'end_date'),
+    ],
+    State('ui-store', 'data'),
+    prevent_initial_call=True,
+)
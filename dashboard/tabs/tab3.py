@@ -1,48 +1,124 @@
 from dash import dcc
-from dash import html
-import plotly.graph_objs as go
+from dash import html, Patch, no_update
 import dash.dependencies as ddep
 import dash_extensions as de
 
-from app import app, db 
+from app import app, db
+import terminal
+from explain import render_plan
 
 tab3_layout = dcc.Tab(label='SQL', children=[
     html.H2("SQL Terminal"),
-    html.Div(id='sql-query-output', style={'whiteSpace': 'pre-line', 'overflowY': 'auto', 'height': 500, 
+    html.P("Lecture seule : SELECT, WITH, EXPLAIN… Les modifications de la base sont refusées.",
+           style={'color': 'grey'}),
+    dcc.Store(id='sql-session', storage_type='session'),
+    html.Div(id='sql-query-output', style={'whiteSpace': 'pre-line', 'overflowY': 'auto', 'height': 500,
                                            'border': '1px solid #ccc', 'padding': '10px'}),
     de.Keyboard(
         dcc.Textarea(
             id='sql-query-input',
             style={'width': '100%', 'height': "2em"},
-            placeholder='Enter your SQL query here...',
+            placeholder='Enter your SQL query here (read only)...',
         ),
         captureKeys=["Enter"],
         id='sql-query-key'
-    )
+    ),
+    html.Div([
+        dcc.Checklist(
+            id='sql-profile',
+            options=[{"label": " Profiler (EXPLAIN ANALYZE)", "value": "profile"}],
+            value=[],
+            inline=True,
+            style={'display': 'inline-block', 'marginRight': '1rem'},
+        ),
+        html.Button("Page suivante", id='sql-next-page', n_clicks=0, style={'marginRight': '1rem'}),
+        html.Button("Annuler la requête", id='sql-cancel', n_clicks=0, style={'marginRight': '1rem'}),
+        html.Span(id='sql-status', style={'color': 'grey'}),
+    ]),
 ])
 
+
+def render_entry(entry):
+    """Render one history entry of the terminal"""
+    if "error" in entry:
+        return html.Div([html.Span("error ", style={'color': 'red'}), html.Pre(entry["error"]), html.Br()])
+    if "plan" in entry:
+        return html.Div([html.Pre(html.B("EXPLAIN ANALYZE " + entry["query"])),
+                         render_plan(entry["plan"], entry["chunks"], entry["chunk_counts"]), html.Br()])
+    header = entry["query"] if entry["page"] == 1 else f"{entry['query']}  (page {entry['page']})"
+    if entry["text"] is None:
+        return html.Div([html.Pre([html.B(header), "\nOK"]), html.Br()])
+    footer = f"\n{entry['rows']} lignes, {entry['elapsed']:.2f}s"
+    if entry["capped"]:
+        footer += f" — limite de {terminal.ROW_CAP} lignes atteinte"
+    elif entry["more"]:
+        footer += " — « Page suivante » pour la suite"
+    return html.Div([html.Pre([html.B(header), "\n", entry["text"], footer]), html.Br()])
+
+
+@app.callback(
+    [ddep.Output('sql-session', 'data'),
+     ddep.Output('sql-query-output', 'children')],
+    ddep.Input('sql-query-output', 'id'),
+    ddep.State('sql-session', 'data'),
+)
+def restore_history(_, session_id):
+    if not session_id:
+        return terminal.new_session_id(), []
+    return session_id, [render_entry(e) for e in terminal.get_history(session_id)]
+
+
 @app.callback(
-    [ddep.Output('sql-query-output', 'children'),
-    ddep.Output('sql-query-input', 'value')],
+    [ddep.Output('sql-query-output', 'children', allow_duplicate=True),
+     ddep.Output('sql-query-input', 'value')],
     ddep.Input('sql-query-key', 'n_keydowns'),
     ddep.State('sql-query-input', 'value'),
-    ddep.State('sql-query-output', 'children')
+    ddep.State('sql-session', 'data'),
+    ddep.State('sql-profile', 'value'),
+    # not a background job: its process would exit with the callback and close
+    # the cursor of the next pages. The cancel button stops the statement in
+    # PostgreSQL through the pid published by terminal (cancel_query).
+    running=[
+        (ddep.Output('sql-status', 'children'), "Exécution…", ""),
+        (ddep.Output('sql-next-page', 'disabled'), True, False),
+    ],
+    prevent_initial_call=True,
+)
+def execute_query(n_key, query, session_id, profile):
+    if n_key is None or not query or not session_id:
+        return no_update, query
+    if profile:
+        entry = terminal.explain(session_id, query.strip())
+    else:
+        entry = terminal.execute(session_id, query.strip())
+    # only the new entry travels, the history stays on the server
+    history = Patch()
+    history.append(render_entry(entry))
+    return history, query if "error" in entry else ""
+
+
+@app.callback(
+    ddep.Output('sql-query-output', 'children', allow_duplicate=True),
+    ddep.Input('sql-next-page', 'n_clicks'),
+    ddep.State('sql-session', 'data'),
+    prevent_initial_call=True,
+)
+def next_page(n_clicks, session_id):
+    entry = terminal.next_page(session_id) if n_clicks and session_id else None
+    if entry is None:
+        return no_update
+    history = Patch()
+    history.append(render_entry(entry))
+    return history
+
+
+@app.callback(
+    ddep.Output('sql-status', 'children', allow_duplicate=True),
+    ddep.Input('sql-cancel', 'n_clicks'),
+    ddep.State('sql-session', 'data'),
+    prevent_initial_call=True,
 )
-def execute_query(n_key, query, history):
-    if history is None:
-        history = []
-    if n_key is None or not query:
-        return history, query
-    try:
-        result_df = db.df_query(query)
-        if len(result_df) == 0:
-            error_msg = str(db.logger.get_last_message())
-            try:
-                error_msg = error_msg.split(") ")[1].split("\n\n")[0]
-            except:
-                pass
-            if error_msg != "df_query: " + query:
-                return history + [ html.Span("error ", style={'color': 'red'}), html.Pre(error_msg), html.Br() ], query
-        return history + [html.Pre([html.B(query), result_df.to_string()]), html.Br()], ""
-    except Exception as e:
-        return history + [html.Pre(str(e)),], query
+def cancel_query(n_clicks, session_id):
+    if n_clicks and session_id and terminal.cancel(session_id):
+        return "Requête annulée."
+    return "Aucune requête en cours."
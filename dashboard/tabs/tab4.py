@@ -0,0 +1,102 @@
+# tabs/tab4.py
+
+from dash import dcc, html, Output, Input, State, ClientsideFunction
+import dash_bootstrap_components as dbc
+import dash_ag_grid as dag
+
+from app import app
+from screener import screen, CRITERIA, YEAR_DAYS
+
+PERCENT = {"function": "params.value == null ? '' : d3.format('+.2%')(params.value)"}
+NUMBER = {"function": "params.value == null ? '' : d3.format('.2f')(params.value)"}
+
+# colonnes affichées : nom -> (titre, format)
+COLUMNS = {
+    "symbol": ("Action", None),
+    "name": ("Nom", None),
+    "close": ("Clôture", NUMBER),
+    "change": ("Variation", PERCENT),
+    "volatility": ("Volatilité (an.)", {"function": "params.value == null ? '' : d3.format('.1%')(params.value)"}),
+    "volume": ("Volume", {"function": "params.value == null ? '' : d3.format(',.0f')(params.value)"}),
+    "volume_spike": ("Volume / moyenne", NUMBER),
+    "high_52w": ("Clôture / plus haut 52 sem.", {"function": "params.value == null ? '' : d3.format('.1%')(params.value)"}),
+}
+
+tab4_layout = html.Div([
+    html.H1("Tab4 - Screener"),
+
+    dbc.Row([
+        dbc.Col([
+            html.Label("Critère"),
+            dcc.Dropdown(
+                id="screener-criterion",
+                options=[{"label": label, "value": key} for key, (label, _, _) in CRITERIA.items()],
+                value="gainers",
+                clearable=False,
+            ),
+        ], width=4),
+        dbc.Col([
+            html.Label("Fenêtre (jours)"),
+            dcc.Input(id="screener-window", type="number", min=2, max=YEAR_DAYS, step=1, value=20,
+                      debounce=True, className="form-control"),
+        ], width=2),
+        dbc.Col([
+            html.Label("Volume minimum"),
+            dcc.Input(id="screener-min-volume", type="number", min=0, value=0,
+                      debounce=True, className="form-control"),
+        ], width=2),
+        dbc.Col([
+            html.Label("Au"),
+            dcc.DatePickerSingle(id="screener-date", placeholder="Dernier jour", display_format="YYYY-MM-DD",
+                                 clearable=True),
+        ], width=4),
+    ], className="mb-4"),
+
+    html.P(id="screener-info", className="text-muted"),
+    dag.AgGrid(
+        id="screener-grid",
+        columnDefs=[
+            dict({"field": col, "headerName": header, "sortable": True},
+                 **({"valueFormatter": fmt} if fmt else {}))
+            for col, (header, fmt) in COLUMNS.items()
+        ],
+        rowData=[],
+        defaultColDef={"flex": 1, "minWidth": 100, "resizable": True},
+        dashGridOptions={"pagination": True, "paginationPageSize": 50, "rowSelection": "single"},
+        style={"height": "500px"},
+    ),
+])
+
+RESULT_SIZE = 200
+
+
+@app.callback(
+    [
+        Output("screener-grid", "rowData"),
+        Output("screener-info", "children"),
+    ],
+    [
+        Input("screener-criterion", "value"),
+        Input("screener-window", "value"),
+        Input("screener-min-volume", "value"),
+        Input("screener-date", "date"),
+    ],
+)
+def update_screener(criterion, window, min_volume, as_of):
+    window = int(window) if window and window >= 2 else 20
+    df = screen(criterion, window, as_of, RESULT_SIZE, min_volume or 0)
+    if df.empty:
+        return [], "Aucune donnée journalière."
+    info = (f"{len(df)} premières sociétés au {df['date'].iloc[0]}, fenêtre de {window} jours. "
+            "Cliquez sur une ligne pour ajouter l'action au graphique.")
+    return df[list(COLUMNS)].to_dict("records"), info
+
+
+# a clicked row adds its symbol to the selection of tab1
+app.clientside_callback(
+    ClientsideFunction(namespace="series", function_name="addSymbol"),
+    Output("ui-store", "data", allow_duplicate=True),
+    Input("screener-grid", "selectedRows"),
+    State("ui-store", "data"),
+    prevent_initial_call=True,
+)
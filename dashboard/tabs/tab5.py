@@ -0,0 +1,115 @@
+# tabs/tab5.py
+
+import datetime
+from dash import dcc, html, Output, Input, State, no_update
+import dash_bootstrap_components as dbc
+
+from app import app
+import figures
+from correlation import correlations, pair_rolling
+from universe import cids_of, most_traded
+
+MAX_UNIVERSE = 500
+
+tab5_layout = html.Div([
+    html.H1("Tab5 - Corrélations"),
+
+    dbc.Row([
+        dbc.Col([
+            html.Label("Sociétés"),
+            dcc.RadioItems(
+                id="corr-universe",
+                options=[
+                    {"label": "Sélection du graphique", "value": "selection"},
+                    {"label": "Les plus échangées", "value": "top"},
+                ],
+                value="top",
+                inline=True,
+            ),
+            dcc.Input(id="corr-top", type="number", min=2, max=MAX_UNIVERSE, step=1, value=100,
+                      debounce=True, className="form-control"),
+        ], width=4),
+        dbc.Col([
+            html.Label("Fenêtre"),
+            dcc.Dropdown(
+                id="corr-window",
+                options=[
+                    {"label": "Toute la période", "value": 0},
+                    {"label": "20 derniers jours", "value": 20},
+                    {"label": "60 derniers jours", "value": 60},
+                    {"label": "120 derniers jours", "value": 120},
+                    {"label": "250 derniers jours", "value": 250},
+                ],
+                value=0,
+                clearable=False,
+            ),
+        ], width=3),
+        dbc.Col([
+            html.Label("Période"),
+            dcc.DatePickerRange(
+                id="corr-date-picker",
+                start_date=(datetime.date.today() - datetime.timedelta(days=730)),
+                end_date=datetime.date.today(),
+                display_format="YYYY-MM-DD",
+            ),
+        ], width=5),
+    ], className="mb-4"),
+
+    dcc.Graph(id="corr-heatmap", style={"height": "700px"}),
+    html.P("Cliquez sur une case pour la corrélation glissante de la paire.", className="text-muted"),
+    dcc.Graph(id="corr-pair"),
+])
+
+
+@app.callback(
+    Output("corr-heatmap", "figure"),
+    [
+        Input("corr-universe", "value"),
+        Input("corr-top", "value"),
+        Input("corr-window", "value"),
+        Input("corr-date-picker", "start_date"),
+        Input("corr-date-picker", "end_date"),
+    ],
+    State("ui-store", "data"),
+)
+def update_heatmap(universe, top, window, start_date, end_date, ui):
+    if universe == "selection":
+        cids = cids_of((ui or {}).get("symbols") or [])
+    else:
+        cids = most_traded(min(int(top or 100), MAX_UNIVERSE))
+    result = correlations(cids, window or None, start_date, end_date)
+    layout = {"title": {"text": "Corrélation des rendements journaliers", "x": 0.5},
+              "yaxis": {"autorange": "reversed", "type": "category"},
+              "margin": {"l": 80, "r": 20, "t": 50, "b": 80}}
+    if not result or len(result[0]) < 2:
+        layout["title"]["text"] = "Pas assez de sociétés avec des données sur la période"
+        return figures.figure([], layout, xaxis_type="category")
+    symbols, _, matrix = result
+    return figures.figure([figures.heatmap(matrix, symbols)], layout, xaxis_type="category")
+
+
+@app.callback(
+    Output("corr-pair", "figure"),
+    Input("corr-heatmap", "clickData"),
+    [
+        State("corr-window", "value"),
+        State("corr-date-picker", "start_date"),
+        State("corr-date-picker", "end_date"),
+    ],
+    prevent_initial_call=True,
+)
+def update_pair(click, window, start_date, end_date):
+    if not click:
+        return no_update
+    point = click["points"][0]
+    pair = cids_of([point["x"], point["y"]])
+    if len(pair) != 2:
+        return no_update
+    window = window or 60
+    df = pair_rolling(pair[0], pair[1], window, start_date, end_date)
+    trace = figures.line(figures.dates_ms(df["date"]), df["correlation"],
+                         f"{point['y']} / {point['x']}", webgl=len(df) > figures.GL_THRESHOLD)
+    return figures.figure([trace], {
+        "title": {"text": f"Corrélation glissante sur {window} jours : {point['y']} / {point['x']}", "x": 0.5},
+        "yaxis": {"range": [-1, 1]},
+    })
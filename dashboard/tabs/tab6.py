@@ -0,0 +1,177 @@
+# tabs/tab6.py
+
+import datetime
+import hashlib
+import os
+
+from dash import dcc, html, Output, Input, State, no_update
+import dash_bootstrap_components as dbc
+import dash_ag_grid as dag
+
+from app import app
+import backtest
+import cache
+import figures
+from universe import get_cube, cache_version, cids_of, company_labels, most_traded
+
+MAX_UNIVERSE = 1000
+WORKERS = int(os.environ.get("BACKTEST_WORKERS", os.cpu_count() or 1))
+RESULT_TTL = 24 * 3600
+
+PERCENT = {"function": "params.value == null ? '' : d3.format('+.1%')(params.value)"}
+NUMBER = {"function": "params.value == null ? '' : d3.format('.2f')(params.value)"}
+RESULT_COLUMNS = [
+    {"field": "total_return", "headerName": "Rendement", "valueFormatter": PERCENT},
+    {"field": "annual_return", "headerName": "Rendement annuel", "valueFormatter": PERCENT},
+    {"field": "sharpe", "headerName": "Sharpe", "valueFormatter": NUMBER},
+    {"field": "max_drawdown", "headerName": "Perte max.", "valueFormatter": PERCENT},
+]
+
+tab6_layout = html.Div([
+    html.H1("Tab6 - Backtest"),
+
+    dbc.Row([
+        dbc.Col([
+            html.Label("Stratégie"),
+            dcc.Dropdown(
+                id="bt-strategy",
+                options=[{"label": label, "value": key} for key, (label, _) in backtest.STRATEGIES.items()],
+                value="sma",
+                clearable=False,
+            ),
+        ], width=4),
+        dbc.Col([
+            html.Label("Sociétés"),
+            dcc.RadioItems(
+                id="bt-universe",
+                options=[
+                    {"label": "Sélection du graphique", "value": "selection"},
+                    {"label": "Les plus échangées", "value": "top"},
+                ],
+                value="top",
+                inline=True,
+            ),
+            dcc.Input(id="bt-top", type="number", min=1, max=MAX_UNIVERSE, step=1, value=200,
+                      className="form-control"),
+        ], width=3),
+        dbc.Col([
+            html.Label("Frais (points de base)"),
+            dcc.Input(id="bt-cost", type="number", min=0, step=1, value=10, className="form-control"),
+        ], width=2),
+        dbc.Col([
+            html.Label("Période"),
+            dcc.DatePickerRange(
+                id="bt-date-picker",
+                start_date=(datetime.date.today() - datetime.timedelta(days=5 * 365)),
+                end_date=datetime.date.today(),
+                display_format="YYYY-MM-DD",
+            ),
+        ], width=3),
+    ], className="mb-2"),
+
+    html.Button("Lancer le balayage", id="bt-run", n_clicks=0, className="btn btn-primary mb-2"),
+    html.Progress(id="bt-progress", style={"display": "none"}),
+    html.P(id="bt-info", className="text-muted"),
+
+    dag.AgGrid(
+        id="bt-sweep-grid",
+        rowData=[],
+        columnDefs=[],
+        defaultColDef={"flex": 1, "minWidth": 90, "resizable": True, "sortable": True},
+        style={"height": "300px"},
+    ),
+    dcc.Graph(id="bt-equity"),
+    dag.AgGrid(
+        id="bt-company-grid",
+        rowData=[],
+        columnDefs=[{"field": "symbol", "headerName": "Action"}, {"field": "name", "headerName": "Nom"}]
+        + RESULT_COLUMNS + [{"field": "trades", "headerName": "Achats"}],
+        defaultColDef={"flex": 1, "minWidth": 90, "resizable": True, "sortable": True},
+        dashGridOptions={"pagination": True, "paginationPageSize": 20},
+        style={"height": "400px"},
+    ),
+])
+
+
+def run_backtest(cids, strategy, start, end, cost, progress=None):
+    """Sweep of strategy on cids and the detail of its best point (Sharpe), cached per data version."""
+    universe = hashlib.sha1(",".join(map(str, sorted(cids))).encode()).hexdigest()[:16]
+    key = f"backtest:{cache_version()}:{universe}:{strategy}:{start}:{end}:{cost}"
+
+    def compute():
+        cube = get_cube()
+        if cube is None or not cids:
+            return None
+        kept = [c for c, r in zip(cids, cube.rows(cids)) if r >= 0]
+        points = backtest.sweep(cube.directory, kept, start, end, strategy, cost, WORKERS, progress)
+        if not points:
+            return None
+        best = max(points, key=lambda p: p["sharpe"])
+        params = {k: best[k] for k in backtest.STRATEGIES[strategy][1]}
+        detail = backtest.evaluate(cube.directory, kept, start, end, strategy, params, cost, detail=True)
+        symbols, names = company_labels(kept)
+        for company, symbol, name in zip(detail["companies"], symbols, names):
+            company.update(symbol=symbol, name=name)
+        return {"points": points, "params": params, "detail": detail}
+
+    return cache.get_or_compute(key, compute, ttl=RESULT_TTL)
+
+
+@app.callback(
+    [
+        Output("bt-sweep-grid", "rowData"),
+        Output("bt-sweep-grid", "columnDefs"),
+        Output("bt-equity", "figure"),
+        Output("bt-company-grid", "rowData"),
+        Output("bt-info", "children"),
+    ],
+    Input("bt-run", "n_clicks"),
+    [
+        State("bt-strategy", "value"),
+        State("bt-universe", "value"),
+        State("bt-top", "value"),
+        State("bt-cost", "value"),
+        State("bt-date-picker", "start_date"),
+        State("bt-date-picker", "end_date"),
+        State("ui-store", "data"),
+    ],
+    # a background job: the sweep uses every core for a while
+    background=True,
+    progress=[Output("bt-progress", "value"), Output("bt-progress", "max")],
+    running=[
+        (Output("bt-progress", "style"), {"width": "100%"}, {"display": "none"}),
+        (Output("bt-run", "disabled"), True, False),
+    ],
+    prevent_initial_call=True,
+)
+def run_sweep(set_progress, n_clicks, strategy, universe, top, cost, start_date, end_date, ui):
+    if not n_clicks:
+        return [no_update] * 5
+    if universe == "selection":
+        cids = cids_of((ui or {}).get("symbols") or [])
+    else:
+        cids = most_traded(min(int(top or 200), MAX_UNIVERSE))
+    result = run_backtest(cids, strategy, start_date, end_date, (cost or 0) / 10000,
+                          lambda done, total: set_progress((str(done), str(total))))
+    if not result:
+        return [], [], figures.figure([], {}), [], "Pas de données pour ces sociétés sur la période."
+
+    params = list(backtest.STRATEGIES[strategy][1])
+    columns = [{"field": p, "headerName": p} for p in params] + RESULT_COLUMNS + [
+        {"field": "trades", "headerName": "Achats"},
+        {"field": "exposure", "headerName": "Exposition", "valueFormatter": PERCENT},
+    ]
+    detail = result["detail"]
+    x = figures.dates_ms(detail["days"])
+    label = ", ".join(f"{k}={v}" for k, v in result["params"].items())
+    fig = figures.figure([
+        figures.line(x, detail["equity"], f"Stratégie ({label})"),
+        figures.line(x, detail["benchmark"], "Achat et conservation"),
+    ], {
+        "title": {"text": f"Meilleur Sharpe : {label}, portefeuille équipondéré", "x": 0.5},
+        "yaxis": {"title": {"text": "Valeur de 1 investi"}},
+    })
+    companies = sorted(detail["companies"], key=lambda c: -c["total_return"])
+    info = (f"{len(result['points'])} jeux de paramètres sur {len(companies)} sociétés "
+            f"({len(detail['days'])} jours).")
+    return result["points"], columns, fig, companies, info
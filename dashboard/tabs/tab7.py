@@ -0,0 +1,155 @@
+# tabs/tab7.py
+
+import pandas as pd
+from dash import dcc, html, ctx, Output, Input, State
+import dash_bootstrap_components as dbc
+import dash_ag_grid as dag
+
+from app import app, db
+from live import LIVE_INTERVAL
+from symbols import get_companies, search_symbol_options
+
+ALERT_LIMIT = 500
+
+# type de règle -> libellé (voir etl/alerts.py)
+KINDS = {
+    "price_above": "Cours au-dessus de",
+    "price_below": "Cours en dessous de",
+    "volume_spike": "Volume du jour / moyenne 20 jours au-dessus de",
+    "rsi_above": "RSI 14 au-dessus de",
+    "rsi_below": "RSI 14 en dessous de",
+}
+
+tab7_layout = html.Div([
+    html.H1("Tab7 - Alertes"),
+
+    dbc.Row([
+        dbc.Col([
+            html.Label("Action (vide : toutes)"),
+            dcc.Dropdown(id="alert-symbol", options=[], placeholder="Symbole, nom ou ISIN"),
+        ], width=3),
+        dbc.Col([
+            html.Label("Règle"),
+            dcc.Dropdown(id="alert-kind", options=[{"label": v, "value": k} for k, v in KINDS.items()],
+                         value="price_above", clearable=False),
+        ], width=4),
+        dbc.Col([
+            html.Label("Seuil"),
+            dcc.Input(id="alert-threshold", type="number", className="form-control"),
+        ], width=2),
+        dbc.Col([
+            html.Label(" "),
+            html.Button("Ajouter la règle", id="alert-add", n_clicks=0, className="btn btn-primary d-block"),
+        ], width=3),
+    ], className="mb-2"),
+    html.P(id="alert-status", className="text-muted"),
+
+    html.H4("Règles actives"),
+    dag.AgGrid(
+        id="alert-rules-grid",
+        rowData=[],
+        columnDefs=[{"field": "id", "headerName": "N°"}, {"field": "symbol", "headerName": "Action"},
+                    {"field": "rule", "headerName": "Règle"}, {"field": "threshold", "headerName": "Seuil"}],
+        defaultColDef={"flex": 1, "resizable": True},
+        style={"height": "200px"},
+    ),
+    html.H4("Dernières alertes"),
+    dag.AgGrid(
+        id="alerts-grid",
+        rowData=[],
+        columnDefs=[{"field": "date", "headerName": "Date"}, {"field": "symbol", "headerName": "Action"},
+                    {"field": "rule", "headerName": "Règle"}, {"field": "threshold", "headerName": "Seuil"},
+                    {"field": "value", "headerName": "Valeur",
+                     "valueFormatter": {"function": "d3.format('.2f')(params.value)"}}],
+        defaultColDef={"flex": 1, "resizable": True, "sortable": True},
+        dashGridOptions={"pagination": True, "paginationPageSize": 50},
+        style={"height": "500px"},
+    ),
+    dcc.Interval(id="alert-interval", interval=LIVE_INTERVAL * 1000),
+])
+
+
+def _symbols(cids):
+    companies = get_companies()
+    by_id = {} if companies is None else dict(zip(companies["id"], companies["symbol"].astype(str).str.strip()))
+    return [by_id.get(c, "") if not pd.isna(c) else "Toutes" for c in cids]
+
+
+def load_rules():
+    rules = db.df_query("SELECT id, cid, kind, threshold FROM alert_rules WHERE active ORDER BY id")
+    if rules.empty:
+        return []
+    rules["symbol"] = _symbols(rules["cid"])
+    rules["rule"] = rules["kind"].map(KINDS)
+    return rules.drop(columns=["cid", "kind"]).to_dict("records")
+
+
+def load_alerts():
+    alerts = db.df_query(
+        """
+        SELECT a.date, a.cid, a.value, r.kind, r.threshold
+        FROM alerts a
+        JOIN alert_rules r ON r.id = a.rule_id
+        ORDER BY a.date DESC
+        LIMIT %s
+        """,
+        params=(ALERT_LIMIT,)
+    )
+    if alerts.empty:
+        return []
+    alerts["date"] = pd.to_datetime(alerts["date"]).dt.strftime("%Y-%m-%d %H:%M")
+    alerts["symbol"] = _symbols(alerts["cid"])
+    alerts["rule"] = alerts["kind"].map(KINDS)
+    return alerts.drop(columns=["cid", "kind"]).to_dict("records")
+
+
+@app.callback(
+    [
+        Output("alert-rules-grid", "rowData"),
+        Output("alerts-grid", "rowData"),
+        Output("alert-status", "children"),
+    ],
+    [
+        Input("alert-interval", "n_intervals"),
+        Input("alert-add", "n_clicks"),
+    ],
+    [
+        State("alert-symbol", "value"),
+        State("alert-kind", "value"),
+        State("alert-threshold", "value"),
+    ],
+)
+def update_alerts(_, n_clicks, symbol, kind, threshold):
+    status = ""
+    if n_clicks and ctx.triggered_id == "alert-add":
+        status = add_rule(symbol, kind, threshold)
+    return load_rules(), load_alerts(), status
+
+
+def add_rule(symbol, kind, threshold):
+    if threshold is None or kind not in KINDS:
+        return "Indiquez un seuil."
+    cid = None
+    if symbol:
+        companies = get_companies()
+        match = companies.loc[companies["symbol"].astype(str).str.strip() == symbol, "id"]
+        if match.empty:
+            return f"Action inconnue : {symbol}"
+        cid = int(match.iloc[0])
+    added = db.execute(
+        "INSERT INTO alert_rules (name, cid, kind, threshold) VALUES (%s, %s, %s, %s) RETURNING id;",
+        (f"{symbol or 'toutes'} {kind} {threshold}", cid, kind, float(threshold)), commit=True
+    )
+    if not added:
+        # execute logs the error and returns None
+        return "La règle n'a pas pu être ajoutée, voir le journal du tableau de bord."
+    return "Règle ajoutée, elle s'applique aux prochains chargements de l'ETL."
+
+
+@app.callback(
+    Output("alert-symbol", "options"),
+    Input("alert-symbol", "search_value"),
+    Input("alert-symbol", "value"),
+)
+def load_alert_symbol_options(search_value, symbol):
+    return search_symbol_options(search_value, symbol)
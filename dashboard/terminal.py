@@ -0,0 +1,262 @@
+# terminal.py
+
+"""
+  Exécution bornée des requêtes du terminal SQL (tab3).
+
+  Chaque requête tourne sur sa propre connexion en lecture seule avec un
+  statement_timeout : les écritures sont refusées avec un message
+  explicite. Les SELECT passent par un curseur côté serveur dont on ne lit
+  qu'une page à la fois, dans la limite de ROW_CAP lignes. L'historique
+  reste côté serveur, dans la session du navigateur (identifiant uuid).
+
+  L'historique et l'état de la dernière requête sont dans le cache partagé :
+  le pid du backend y est publié avant l'exécution, un autre worker peut donc
+  annuler la requête en cours. Le curseur reste dans le worker gunicorn qui a
+  lancé la requête ; un autre worker n'en lit la page suivante qu'en la
+  relançant avec un OFFSET, ce qui n'est sûr que si elle a un ORDER BY.
+"""
+
+import re
+import threading
+import time
+import uuid
+
+import pandas as pd
+import psycopg2
+import psycopg2.errors
+
+import cache
+from app import db
+
+STATEMENT_TIMEOUT = 30000  # ms
+ROW_CAP = 10000  # maximum number of rows read from one query
+PAGE_SIZE = 50
+HISTORY_SIZE = 50  # entries kept per session
+CURSOR_IDLE_TIMEOUT = 600  # s, an unread cursor is closed after that
+SESSION_TTL = 24 * 3600  # s, history kept in the shared cache
+
+_CURSOR_STATEMENTS = ("SELECT", "WITH", "VALUES", "TABLE")
+# blanks, comments and opening parentheses before the first keyword
+_LEADING = re.compile(r"(?:\s+|--[^\n]*|/\*.*?\*/|\()*", re.S)
+_KEYWORD = re.compile(r"[A-Za-z]+")
+_ORDERED = re.compile(r"\bORDER\s+BY\b", re.I)
+
+_lock = threading.Lock()
+_runs = {}  # session id -> QueryRun with an open cursor in this process
+
+
+class QueryRun:
+    """A query of the terminal, its connection and its server-side cursor."""
+
+    def __init__(self, query, run_id=None, page=0, rows_read=0):
+        self.query = query
+        self.run_id = run_id or uuid.uuid4().hex
+        self.connection = None
+        self.cursor = None
+        self.pid = None
+        self.columns = []
+        self.page = page
+        self.rows_read = rows_read
+        self.done = False
+        self.last_use = time.monotonic()
+
+    def start(self, on_connect=None):
+        """Run the query, on_connect() is called once the backend pid is known."""
+        self.connection = db.open_connection(readonly=True)
+        self.pid = self.connection.get_backend_pid()
+        if on_connect is not None:
+            on_connect()
+        with self.connection.cursor() as cursor:
+            cursor.execute("SET statement_timeout = %s", (STATEMENT_TIMEOUT,))
+        query = self.query
+        if statement_keyword(query) in _CURSOR_STATEMENTS:
+            if self.rows_read:
+                # resumed in another process, skip the rows already shown
+                query = f"SELECT * FROM ({query.rstrip().rstrip(';')}\n) AS terminal_query OFFSET {self.rows_read}"
+            self.cursor = self.connection.cursor(name=f"terminal_{self.run_id}")
+            self.cursor.itersize = PAGE_SIZE
+        else:
+            self.cursor = self.connection.cursor()
+        self.cursor.execute(query)
+
+    def state(self):
+        return {"query": self.query, "run_id": self.run_id, "pid": None if self.done else self.pid,
+                "page": self.page, "rows_read": self.rows_read, "done": self.done}
+
+    def fetch_page(self):
+        """Return the next page as a DataFrame, None if the query returns no rows."""
+        self.last_use = time.monotonic()
+        if self.cursor.description is None and not self.cursor.name:
+            self.close()
+            return None
+        size = min(PAGE_SIZE, ROW_CAP - self.rows_read)
+        rows = self.cursor.fetchmany(size) if size > 0 else []
+        self.columns = [c[0] for c in self.cursor.description or []]
+        self.rows_read += len(rows)
+        self.page += 1
+        if len(rows) < size or self.rows_read >= ROW_CAP:
+            self.close()
+        return pd.DataFrame(rows, columns=self.columns)
+
+    def close(self):
+        self.done = True
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except psycopg2.Error:
+                pass
+            self.connection = None
+            self.cursor = None
+
+
+def statement_keyword(query):
+    """First keyword of query in upper case, after comments and opening parentheses."""
+    match = _KEYWORD.match(query, _LEADING.match(query).end())
+    return match.group(0).upper() if match else ""
+
+
+def error_message(e):
+    """Text of a psycopg2 error for the terminal history."""
+    message = (e.pgerror or str(e)).strip()
+    if isinstance(e, psycopg2.extensions.QueryCanceledError):
+        message = "Requête annulée (timeout ou annulation) : " + message
+    elif isinstance(e, psycopg2.errors.ReadOnlySqlTransaction):
+        message = ("Le terminal est en lecture seule, seules les requêtes de lecture "
+                   "(SELECT, WITH, EXPLAIN…) sont acceptées : " + message)
+    return message
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def _close_idle_runs():
+    now = time.monotonic()
+    with _lock:
+        for session_id, run in list(_runs.items()):
+            if now - run.last_use > CURSOR_IDLE_TIMEOUT:
+                run.close()
+            if run.done:
+                del _runs[session_id]
+
+
+def _save_state(session_id, run):
+    cache.set(f"terminal:{session_id}:run", run.state(), SESSION_TTL)
+
+
+def _add_entry(session_id, entry):
+    history = get_history(session_id)
+    history.append(entry)
+    cache.set(f"terminal:{session_id}:history", history[-HISTORY_SIZE:], SESSION_TTL)
+    return entry
+
+
+def get_history(session_id):
+    """Return the history entries of a session."""
+    return cache.get(f"terminal:{session_id}:history") or []
+
+
+def _new_run(session_id, query):
+    _close_idle_runs()
+    with _lock:
+        previous = _runs.pop(session_id, None)
+    if previous is not None:
+        previous.close()
+    run = QueryRun(query)
+    with _lock:
+        _runs[session_id] = run
+    return run
+
+
+def _start(session_id, run):
+    # the backend pid is shared before the statement runs so that any worker can cancel it
+    run.start(lambda: _save_state(session_id, run))
+
+
+def execute(session_id, query):
+    """Run query and return the history entry of its first page."""
+    run = _new_run(session_id, query)
+    t0 = time.time()
+    try:
+        _start(session_id, run)
+        df = run.fetch_page()
+    except psycopg2.Error as e:
+        run.close()
+        return _add_entry(session_id, {"query": query, "error": error_message(e)})
+    finally:
+        _save_state(session_id, run)
+    return _add_entry(session_id, _entry(run, df, time.time() - t0))
+
+
+def explain(session_id, query):
+    """Run query under EXPLAIN ANALYZE and return the history entry of its plan."""
+    run = _new_run(session_id, f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query.rstrip().rstrip(';')}")
+    try:
+        _start(session_id, run)
+        plan = run.cursor.fetchone()[0]
+        run.cursor.execute(
+            "SELECT chunk_name, hypertable_name FROM timescaledb_information.chunks "
+            "WHERE hypertable_name IN ('stocks', 'daystocks')"
+        )
+        chunks = dict(run.cursor.fetchall())
+    except psycopg2.Error as e:
+        return _add_entry(session_id, {"query": query, "error": error_message(e)})
+    finally:
+        run.close()
+        _save_state(session_id, run)
+    counts = {}
+    for hypertable in chunks.values():
+        counts[hypertable] = counts.get(hypertable, 0) + 1
+    return _add_entry(session_id, {"query": query, "plan": plan, "chunks": chunks, "chunk_counts": counts})
+
+
+def next_page(session_id):
+    """Read the next page of the last query, None if there is nothing more."""
+    state = cache.get(f"terminal:{session_id}:run")
+    if state is None or state["done"]:
+        return None
+    with _lock:
+        run = _runs.get(session_id)
+    t0 = time.time()
+    if (run is None or run.run_id != state["run_id"]) and not _ORDERED.search(state["query"]):
+        # without ORDER BY a new execution may return the rows in another order
+        state["done"] = True
+        cache.set(f"terminal:{session_id}:run", state, SESSION_TTL)
+        return _add_entry(session_id, {"query": state["query"], "error": (
+            "La suite n'est plus disponible (le curseur est dans un autre processus) : "
+            "ajoutez un ORDER BY à la requête pour pouvoir la paginer.")})
+    try:
+        if run is None or run.run_id != state["run_id"]:
+            # the cursor lives in another worker, the ORDER BY makes OFFSET safe
+            run = QueryRun(state["query"], state["run_id"], state["page"], state["rows_read"])
+            with _lock:
+                _runs[session_id] = run
+            _start(session_id, run)
+        df = run.fetch_page()
+    except psycopg2.Error as e:
+        run.close()
+        return _add_entry(session_id, {"query": run.query, "error": error_message(e)})
+    finally:
+        if run is not None:
+            _save_state(session_id, run)
+    return _add_entry(session_id, _entry(run, df, time.time() - t0))
+
+
+def cancel(session_id):
+    """Cancel the running query of a session, return True if one was cancelled."""
+    state = cache.get(f"terminal:{session_id}:run")
+    if state is None or state["done"] or state["pid"] is None:
+        return False
+    return db.cancel_backend(state["pid"])
+
+
+def _entry(run, df, elapsed):
+    return {
+        "query": run.query,
+        "page": run.page,
+        "text": None if df is None else df.to_string(),
+        "rows": 0 if df is None else len(df),
+        "more": not run.done,
+        "capped": run.rows_read >= ROW_CAP,
+        "elapsed": elapsed,
+    }
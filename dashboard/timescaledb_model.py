@@ -5,6 +5,9 @@ import time
 import io
 import os
 import csv
+import queue
+import threading
+import uuid
 import psycopg2
 import numpy as np
 import pandas as pd
@@ -26,6 +29,42 @@ initial_markets_data = (
     (100, "International", "int", "", "", ""),  # should be last one
 )
 
+# Liste matérialisée des sociétés qui ont des données, maintenue par l'ETL
+# et lue par le dashboard à la place de la requête sur les deux hypertables
+active_companies_columns = ''' cid SMALLINT PRIMARY KEY,
+                        symbol VARCHAR,
+                        name VARCHAR,
+                        isin CHAR(12),
+                        mid SMALLINT,
+                        first_date TIMESTAMPTZ,
+                        last_date TIMESTAMPTZ,
+                        nb_daystocks INTEGER,
+                        nb_stocks INTEGER
+                    '''
+
+# Règles d'alerte (cid NULL : toutes les sociétés) et alertes déclenchées par
+# l'ETL au chargement des nouvelles lignes de stocks (voir etl/alerts.py)
+alert_rules_columns = ''' id SERIAL PRIMARY KEY,
+                        name VARCHAR,
+                        cid SMALLINT,
+                        kind VARCHAR,
+                        threshold FLOAT4,
+                        active BOOLEAN DEFAULT TRUE
+                    '''
+alerts_columns = ''' date TIMESTAMPTZ,
+                        rule_id INTEGER,
+                        cid SMALLINT,
+                        value FLOAT4,
+                        created_at TIMESTAMPTZ DEFAULT now()
+                    '''
+
+# Change-only stocks (etl.dedup_stocks): an unchanged row is still stored when
+# the last stored row of its cid is STOCKS_KEYFRAME old, so that a row is
+# never carried forward more than STOCKS_FILL_LIMIT by stocks_query(fill=True).
+# The ETL looks STOCKS_FILL_LIMIT back for the last stored row of each cid.
+STOCKS_KEYFRAME = "6D"
+STOCKS_FILL_LIMIT = "7D"
+
 def _psql_insert_copy(table, conn, keys, data_iter):  # mehod used by df_write
     """
     Execute SQL statement inserting data
@@ -57,22 +96,215 @@ def _psql_insert_copy(table, conn, keys, data_iter):  # mehod used by df_write
         cur.copy_expert(sql=sql, file=s_buf)
 
 
+def forward_fill_stocks(rows, dates, fill_limit=STOCKS_FILL_LIMIT):
+    """Rebuild the snapshots of change-only stocks rows.
+
+    rows -- stocks rows (date, cid, value, volume), unchanged ones dropped
+    dates -- the snapshot dates to return
+    fill_limit -- a row is carried forward at most this long
+
+    Returns one row per cid and snapshot date, the last stored row of the cid
+    at that date, with merge_asof instead of a loop over the companies.
+    """
+    rows = rows.sort_values('date', kind='stable').rename(columns={'date': 'stored'})
+    dates = pd.Series(pd.to_datetime(dates)).drop_duplicates().sort_values()
+    grid = pd.MultiIndex.from_product([dates, rows['cid'].unique()], names=['date', 'cid']).to_frame(index=False)
+    filled = pd.merge_asof(grid.sort_values('date', kind='stable'), rows, left_on='date', right_on='stored',
+                           by='cid', direction='backward', tolerance=pd.Timedelta(fill_limit))
+    filled = filled.dropna(subset=['value'])
+    return filled[['date', 'cid', 'value', 'volume']].sort_values(['cid', 'date'], ignore_index=True)
+
+
+class ParallelCopyWriter:
+    """Write dataframes into a table through several connections at once.
+
+    Each stream is a thread with its own connection and its own COPY; a batch
+    is split by time chunk of the hypertable (or by cid when it spans fewer
+    chunks than streams) so that the streams fill different chunks. Nothing
+    is visible before commit(), which ends the run for all the streams: with
+    max_prepared_transactions > 0 the transactions are prepared then committed
+    (two-phase commit), otherwise each is committed once all the streams
+    succeeded. abort() rolls all of them back. Used as a context manager, it
+    commits on success and aborts on an exception.
+    """
+
+    def __init__(self, connect, table, columns, streams=4, shard_by="auto",
+                 chunk_interval=datetime.timedelta(days=7), depth=2, logger=None):
+        """
+        connect -- function opening a new connection
+        columns -- columns of the dataframes, in this order
+        shard_by -- "chunk", "cid" or "auto"
+        depth -- batches waiting per stream before write() blocks
+        """
+        self.table = table
+        self.columns = list(columns)
+        self.shard_by = shard_by
+        self.interval = pd.Timedelta(chunk_interval).value
+        self.logger = logger
+        self.connections = []
+        self.errors = []
+        self.rows = [0] * streams
+        self.xids = None
+        try:
+            for _ in range(streams):
+                self.connections.append(connect())
+            cursor = self.connections[0].cursor()
+            cursor.execute("SHOW max_prepared_transactions;")
+            prepared = int(cursor.fetchone()[0])
+            self.connections[0].rollback()  # tpc_begin needs a connection outside any transaction
+            if prepared >= streams:
+                run = uuid.uuid4().hex[:12]
+                self.xids = [c.xid(0, f"copy-{table}-{run}-{i}", "etl") for i, c in enumerate(self.connections)]
+                for connection, xid in zip(self.connections, self.xids):
+                    connection.tpc_begin(xid)
+        except Exception:
+            for connection in self.connections:
+                connection.close()
+            raise
+        self.queues = [queue.Queue(maxsize=depth) for _ in range(streams)]
+        self.threads = [threading.Thread(target=self._stream, args=(i,), name=f"copy-{table}-{i}", daemon=True)
+                        for i in range(streams)]
+        for thread in self.threads:
+            thread.start()
+
+    def _stream(self, i):
+        sql = "COPY {} ({}) FROM STDIN WITH CSV".format(self.table, ", ".join(f'"{c}"' for c in self.columns))
+        cursor = self.connections[i].cursor()
+        while True:
+            df = self.queues[i].get()
+            if df is None:
+                return
+            if self.errors:
+                continue  # the run is lost, drain the queue
+            try:
+                s_buf = io.StringIO()
+                df.to_csv(s_buf, index=False, header=False)
+                s_buf.seek(0)
+                cursor.copy_expert(sql=sql, file=s_buf)
+                self.rows[i] += len(df)
+            except Exception as e:
+                self.errors.append(e)
+
+    def _shards(self, df):
+        """Stream number of every row of df."""
+        n = len(self.connections)
+        dates = pd.to_datetime(df['date'])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_convert(None)
+        chunk = dates.to_numpy(dtype='datetime64[ns]').view('i8') // self.interval
+        if self.shard_by == "chunk" or (self.shard_by == "auto" and len(np.unique(chunk)) >= n):
+            return chunk % n
+        return df['cid'].to_numpy(dtype=np.int64) % n
+
+    def write(self, df):
+        """Queue the rows of df, blocks while the streams are behind."""
+        if self.errors:
+            raise self.errors[0]
+        if df.empty:
+            return
+        df = df[self.columns]
+        shards = self._shards(df)
+        for i in range(len(self.connections)):
+            part = df[shards == i]
+            if not part.empty:
+                self.queues[i].put(part)
+
+    def _join(self):
+        for q in self.queues:
+            q.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def commit(self):
+        """Wait for the streams and commit all of them, or none if one failed."""
+        self._join()
+        if self.errors:
+            self._rollback()
+            raise self.errors[0]
+        committed = []
+        try:
+            if self.xids is None:
+                for i, connection in enumerate(self.connections):
+                    connection.commit()
+                    committed.append(i)
+            else:
+                try:
+                    for connection in self.connections:
+                        connection.tpc_prepare()
+                except Exception:
+                    # prepared or not, tpc_rollback ends the transaction of the connection
+                    for connection in self.connections:
+                        connection.tpc_rollback()
+                    raise
+                for i, connection in enumerate(self.connections):
+                    connection.tpc_commit()
+                    committed.append(i)
+        except Exception as e:
+            if committed and self.logger:
+                # the run is partly committed: the prepared rest is rolled back by
+                # TimescaleStockMarketModel.recover_prepared_copies at the next start
+                self.logger.error(f"COPY into {self.table} partly committed: streams {committed} "
+                                  f"of {len(self.connections)} committed, then {e}")
+            raise
+        finally:
+            self._close()
+        return sum(self.rows)
+
+    def abort(self):
+        """Stop the streams and roll back all of them."""
+        self.errors.append(RuntimeError("aborted"))
+        self._join()
+        self._rollback()
+        self._close()
+
+    def _rollback(self):
+        for connection in self.connections:
+            try:
+                if self.xids is None:
+                    connection.rollback()
+                else:
+                    connection.tpc_rollback()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Exception with rollback: {e}")
+
+    def _close(self):
+        for connection in self.connections:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
 class TimescaleStockMarketModel:
     """ Bourse model with TimeScaleDB persistence."""
 
-    def __init__(self, database, user=None, host=None, password=None, port=None, remove_all=False):
+    def __init__(self, database, user=None, host=None, password=None, port=None, remove_all=False,
+                 readonly=False):
         """Create a TimescaleStockMarketModel
 
         database -- The name of the persistence database.
         user     -- Username to connect with to the database. Same as the
                     database name by default.
         remove_all -- REMOVE ALL DATA from the database
+        readonly -- the schema is not checked nor created (no probe, no DDL),
+                    for readers like the dashboard; the shared connection is
+                    in autocommit so that no read leaves it idle in a
+                    transaction, holding locks the ETL purge would wait for
         """
         self.__database = database
         self.__user = user or database
         self.__host = host or 'localhost'
         self.__port = port or 5432
         self.__password = password or ''
+        self.__readonly = readonly
         self.__squash = False
         self.__engine = sqlalchemy.create_engine(f"timescaledb://{self.__user}:{self.__password}@{self.__host}:{self.__port}/{self.__database}")
         # markets
@@ -86,13 +318,52 @@ class TimescaleStockMarketModel:
         #self.__boursorama_cid = {} 
 
         self.logger = mylogging.getLogger(__name__, filename="/tmp/bourse.log")
-        self.connection = self._connect_to_database()
-
+        self.__pid = os.getpid()
+        self.__parent_connections = []
+        self.__stats = threading.local()
+        self.__connection = self._shared_connection()
+        if readonly:
+            return
+
+        # before the purge, which would wait for their locks
+        self.recover_prepared_copies()
         self.logger.info("Setup database generates an error if it exists already, it's ok")
         if remove_all:
             self._purge_database()
         self._setup_database()
 
+    @property
+    def connection(self):
+        """The shared psycopg2 connection, reopened in a forked process."""
+        self._check_fork()
+        return self.__connection
+
+    @connection.setter
+    def connection(self, connection):
+        self.__connection = connection
+
+    def _check_fork(self):
+        """
+            A connection must not be used by two processes: after a fork (gunicorn
+            workers, background callbacks) the child opens its own connection and
+            drops the pool inherited from its parent without closing its sockets.
+        """
+        if self.__pid == os.getpid():
+            return
+        self.__pid = os.getpid()
+        self.__engine.dispose(close=False)
+        # keep the parent's connection alive, freeing it would send a
+        # terminate message on the socket the parent is still using
+        self.__parent_connections.append(self.__connection)
+        self.__connection = self._shared_connection()
+
+    def _shared_connection(self):
+        """A new shared connection, in autocommit for a readonly model."""
+        connection = self._connect_to_database()
+        if self.__readonly:
+            connection.autocommit = True
+        return connection
+
     def _connect_to_database(self, retry_limit=5, retry_delay=1):
         """
             With a SQL server running in a Docker, it can take time to connect if all
@@ -277,6 +548,9 @@ class TimescaleStockMarketModel:
                 self._create_table("file_done", "name VARCHAR PRIMARY KEY")
                 self._create_table("tags", "name VARCHAR PRIMARY KEY, value VARCHAR")
                 self._create_table("error_dates", "date TIMESTAMPTZ")
+                self._create_table("active_companies", active_companies_columns)
+                self._create_table("alert_rules", alert_rules_columns)
+                self._create_table("alerts", alerts_columns)
 
                 # Create hypertables
                 self._create_hypertable("stocks", "date")
@@ -285,6 +559,7 @@ class TimescaleStockMarketModel:
                 # Create indexes
                 self._create_index("stocks", "idx_cid_stocks", "cid, date DESC")
                 self._create_index("daystocks", "idx_cid_daystocks", "cid, date DESC")
+                self._create_index("alerts", "idx_date_alerts", "date DESC")
 
                 # Insert initial market data
                 self._insert_data("markets", initial_markets_data)
@@ -301,6 +576,9 @@ class TimescaleStockMarketModel:
         self._drop_table("file_done")
         self._drop_table("tags")
         self._drop_table("error_dates")
+        self._drop_table("active_companies")
+        self._drop_table("alert_rules")
+        self._drop_table("alerts")
 
         self._drop_sequence("market_id_seq")
         self._drop_sequence("company_id_seq")
@@ -320,6 +598,7 @@ class TimescaleStockMarketModel:
         self.logger.debug('SQL: QUERY: %s' % pretty)
         if cursor is None:
             cursor = self.connection.cursor()
+        t0 = time.perf_counter()
         try:
             cursor.execute(query, args)
             if commit:
@@ -329,6 +608,8 @@ class TimescaleStockMarketModel:
             self.logger.error(f"Exception with execute: {e}")
             if self.connection:
                 self.connection.rollback()
+        finally:
+            self._count_db_time(t0)
 
 
     def df_write(self, df, table, args=None, commit=False, if_exists="append", 
@@ -341,19 +622,129 @@ class TimescaleStockMarketModel:
         :param other args: see https://pandas.pydata.org/pandas-docs/stable/reference/api/pandas.to_sql.html
         """
         self.logger.debug("df_write")
-        df.to_sql(
-            table,
-            con = self.__engine,
-            if_exists=if_exists,
-            index=index,
-            index_label=index_label,
-            chunksize=chunksize,
-            dtype=dtype,
-            method=method,
-        )
+        self._check_fork()
+        t0 = time.perf_counter()
+        try:
+            df.to_sql(
+                table,
+                con = self.__engine,
+                if_exists=if_exists,
+                index=index,
+                index_label=index_label,
+                chunksize=chunksize,
+                dtype=dtype,
+                method=method,
+            )
+        finally:
+            self._count_db_time(t0)
         if commit:
             self.commit()
 
+    def copy_writer(self, table, columns, streams=4, shard_by="auto", hypertable=None):
+        """A ParallelCopyWriter into table with streams connections.
+
+        The batches are split along the chunks of the hypertable (table by
+        default, the target of a staging table), whose interval is read from
+        TimescaleDB (7 days by default).
+        """
+        res = self.raw_query(
+            "SELECT time_interval FROM timescaledb_information.dimensions "
+            "WHERE hypertable_name = %s AND time_interval IS NOT NULL",
+            (hypertable or table,)
+        )
+        interval = res[0][0] if res else datetime.timedelta(days=7)
+        return ParallelCopyWriter(self.open_connection, table, columns, streams=streams,
+                                  shard_by=shard_by, chunk_interval=interval, logger=self.logger)
+
+    def recover_prepared_copies(self):
+        """Roll back the prepared transactions of a ParallelCopyWriter whose process
+        died between tpc_prepare and tpc_commit. They hold their locks and block
+        vacuum until then. Called at startup by the ETL, when no copy is running.
+        Returns the number of transactions rolled back."""
+        connection = self._connect_to_database()
+        try:
+            xids = [xid for xid in connection.tpc_recover() if str(xid.gtrid).startswith("copy-")]
+            for xid in xids:
+                connection.tpc_rollback(xid)
+                self.logger.warning(f"Rolled back the prepared transaction {xid.gtrid}")
+        finally:
+            connection.close()
+        return len(xids)
+
+    def create_staging(self, table):
+        """Create an empty UNLOGGED table like table for a reload, return its name."""
+        name = f"{table}_staging_{uuid.uuid4().hex[:8]}"
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"CREATE UNLOGGED TABLE {name} (LIKE {table} INCLUDING DEFAULTS);")
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return name
+
+    def drop_staging(self, staging):
+        """Drop a staging table left by a failed reload."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {staging};")
+            self.connection.commit()
+        except Exception as e:
+            self.logger.error(f"Exception with drop_staging: {e}")
+            self.connection.rollback()
+
+    def replace_range(self, table, staging, start, end):
+        """Replace the rows of the hypertable table dated from start to end
+        (included) by the rows of staging, which is dropped.
+
+        One transaction: the chunks lying inside the range are dropped whole
+        (no row by row DELETE, nothing left to vacuum), the rows of the
+        chunks across its bounds are deleted, then the staging rows are
+        inserted. Readers see the old rows or the new ones, never an empty
+        or partial range. Returns the number of dropped chunks.
+
+        The cost: drop_chunks takes ACCESS EXCLUSIVE locks on the hypertable
+        and its chunks until the commit, so readers of table (the dashboard)
+        wait for the whole INSERT ... SELECT. That INSERT is one serial,
+        WAL-logged stream of every staging row: the parallel UNLOGGED COPY
+        only speeds up the loading, not the swap.
+        """
+        cursor = self.connection.cursor()
+        t0 = time.perf_counter()
+        try:
+            # drop_chunks only takes the chunks entirely in [newer_than, older_than)
+            cursor.execute("SELECT drop_chunks(%s, older_than => %s, newer_than => %s);",
+                           (table, pd.Timestamp(end) + pd.Timedelta(1, 'us'), pd.Timestamp(start)))
+            dropped = cursor.rowcount
+            cursor.execute(f"DELETE FROM {table} WHERE date >= %s AND date <= %s;", (start, end))
+            cursor.execute(f"INSERT INTO {table} SELECT * FROM {staging};")
+            cursor.execute(f"DROP TABLE {staging};")
+            self.connection.commit()
+        except Exception as e:
+            self.logger.exception(f"SQL error in replace_range: {e}")
+            self.connection.rollback()
+            self.drop_staging(staging)
+            raise
+        finally:
+            self._count_db_time(t0)
+        return dropped
+
+    def open_connection(self, readonly=False):
+        """Open a new connection, apart from the shared one.
+
+        Used for statements that must be bounded or cancelled on their own
+        (the SQL terminal of the dashboard) without disturbing the others.
+        """
+        connection = self._connect_to_database()
+        if readonly:
+            connection.set_session(readonly=True)
+        return connection
+
+    def cancel_backend(self, pid):
+        """Cancel the statement running in the backend pid (pg_cancel_backend)."""
+        res = self.raw_query("SELECT pg_cancel_backend(%s)", (pid,))
+        return bool(res and res[0][0])
+
     # general query methods
 
     def raw_query(self, query, args=None, cursor=None):
@@ -365,6 +756,7 @@ class TimescaleStockMarketModel:
         self.logger.debug('SQL: QUERY: %s' % pretty)
         if cursor is None:
             cursor = self.connection.cursor()
+        t0 = time.perf_counter()
         try:
             cursor.execute(query, args)
             query = query.strip().upper()
@@ -374,6 +766,8 @@ class TimescaleStockMarketModel:
             self.logger.error(f"Exception with raw_query: {e}")
             if self.connection:
                 self.connection.rollback()
+        finally:
+            self._count_db_time(t0)
 
     def df_query(self, query, args=None, index_col=None, coerce_float=True, params=None, 
                  parse_dates=None, columns=None, chunksize=None, dtype=None):
@@ -388,6 +782,8 @@ class TimescaleStockMarketModel:
         if args is not None:
             query = query % args
         self.logger.debug('df_query: %s' % query)
+        self._check_fork()
+        t0 = time.perf_counter()
         try:
             res = pd.read_sql(query, self.__engine, index_col=index_col, coerce_float=coerce_float, 
                            params=params, parse_dates=parse_dates, columns=columns, 
@@ -395,20 +791,172 @@ class TimescaleStockMarketModel:
         except Exception as e:
             self.logger.error(e)
             res = pd.DataFrame()
+        finally:
+            self._count_db_time(t0)
         return res
 
+    def stocks_query(self, start, end, cids=None, fill=False, fill_limit=STOCKS_FILL_LIMIT):
+        """stocks rows between start and end (included), ordered by cid and date.
+
+        With fill, the rows dropped by the change-only ingest (see etl.dedup_stocks)
+        are rebuilt: every cid gets a row at every snapshot date of the period,
+        carried forward from its last stored row, the one before start included.
+        This is the only reader that rebuilds them: the other queries on stocks
+        (live refresh, charts, SQL terminal) see gaps when the tag stocks_dedup
+        is set.
+        """
+        where, params = "date >= %s AND date <= %s", [start, end]
+        if cids is not None:
+            where += " AND cid = ANY(%s)"
+            params.append([int(c) for c in cids])
+        df = self.df_query(f"SELECT date, cid, value, volume FROM stocks WHERE {where} ORDER BY cid, date",
+                           params=tuple(params), parse_dates=['date'])
+        if not fill or df.empty:
+            return df
+        seed_where = where.replace("date >= %s AND date <= %s", "date >= %s AND date < %s")
+        seed = self.df_query(
+            f"SELECT DISTINCT ON (cid) date, cid, value, volume FROM stocks WHERE {seed_where} ORDER BY cid, date DESC",
+            params=(pd.Timestamp(start) - pd.Timedelta(fill_limit), start) + tuple(params[2:]),
+            parse_dates=['date']
+        )
+        return forward_fill_stocks(pd.concat([seed, df], ignore_index=True), df['date'], fill_limit)
+
+    def parquet_query(self, path, start=None, end=None, cids=None, market=None, columns=None):
+        """Read ticks from the Parquet archive written by the ETL (market=/year=/month=).
+
+        Only the partitions of the market and months asked for are opened and,
+        inside the files, the row groups whose date and cid statistics can match.
+
+        :param path: root of the archive
+        :param start, end: dates included, None for no bound
+        :param cids: iterable of company ids, None for all
+        :param market: market alias (see initial_markets_data), None for all
+        :param columns: columns to return, default date, cid, value, volume
+        :return: a dataframe
+        """
+        import pyarrow.dataset as ds
+
+        if not os.path.isdir(path):
+            return pd.DataFrame(columns=columns or ['date', 'cid', 'value', 'volume'])
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        year, month, date = ds.field("year"), ds.field("month"), ds.field("date")
+        filters = []
+        if market is not None:
+            filters.append(ds.field("market") == market)
+        if start is not None:
+            start = pd.Timestamp(start).tz_localize(None)
+            filters.append((year > start.year) | ((year == start.year) & (month >= start.month)))
+            filters.append(date >= start.to_pydatetime())
+        if end is not None:
+            end = pd.Timestamp(end).tz_localize(None)
+            filters.append((year < end.year) | ((year == end.year) & (month <= end.month)))
+            filters.append(date <= end.to_pydatetime())
+        if cids is not None:
+            filters.append(ds.field("cid").isin([int(c) for c in cids]))
+        expr = None
+        for f in filters:
+            expr = f if expr is None else expr & f
+        t0 = time.perf_counter()
+        try:
+            table = dataset.to_table(columns=columns or ['date', 'cid', 'value', 'volume'], filter=expr)
+        finally:
+            self._count_db_time(t0)
+        return table.to_pandas()
+
+    # materialized views
+
+    def refresh_active_companies(self, commit=True):
+        """Rebuild the active_companies table and bump the data version.
+
+        One row per company having data in daystocks or stocks, with the first
+        and last date and the row counts of both tables. The two hypertables are
+        scanned here, once per ETL run, instead of at each dashboard page load.
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS active_companies ({active_companies_columns});")
+            cursor.execute("DELETE FROM active_companies;")
+            cursor.execute(
+                """
+                INSERT INTO active_companies
+                SELECT c.id, c.symbol, c.name, c.isin, c.mid,
+                       LEAST(d.first_date, s.first_date),
+                       GREATEST(d.last_date, s.last_date),
+                       COALESCE(d.nb, 0), COALESCE(s.nb, 0)
+                FROM companies c
+                LEFT JOIN (SELECT cid, MIN(date) AS first_date, MAX(date) AS last_date, COUNT(*) AS nb
+                           FROM daystocks GROUP BY cid) d ON d.cid = c.id
+                LEFT JOIN (SELECT cid, MIN(date) AS first_date, MAX(date) AS last_date, COUNT(*) AS nb
+                           FROM stocks GROUP BY cid) s ON s.cid = c.id
+                WHERE (d.cid IS NOT NULL OR s.cid IS NOT NULL)
+                  AND c.symbol IS NOT NULL AND c.symbol != ''
+                ON CONFLICT (cid) DO NOTHING;
+                """
+            )
+            self.set_tag("data_version", str(time.time_ns()), cursor=cursor)
+            if commit:
+                self.commit()
+        except Exception as e:
+            self.logger.exception("SQL error: %s" % e)
+            self.connection.rollback()
+
+    # alerts
+
+    def ensure_alert_tables(self):
+        """Create the alert_rules and alerts tables of a database set up before them."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS alert_rules ({alert_rules_columns});")
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS alerts ({alerts_columns});")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_date_alerts ON alerts (date DESC);")
+            self.commit()
+        except Exception as e:
+            self.logger.exception("SQL error: %s" % e)
+            self.connection.rollback()
+
+    def get_alert_rules(self):
+        """The active alert rules as a dataframe (id, name, cid, kind, threshold)."""
+        return self.df_query("SELECT id, name, cid, kind, threshold FROM alert_rules WHERE active ORDER BY id")
+
+    def get_data_version(self):
+        """Return the data version written by the last ETL run, None if unknown."""
+        return self.get_tag("data_version")
+
     # system methods
 
     def commit(self):
         if not self.__squash:
             self.connection.commit()
 
+    def db_time(self):
+        """Seconds spent in the database by the calling thread since it started."""
+        return getattr(self.__stats, "db_time", 0.0)
+
+    def _count_db_time(self, t0):
+        self.__stats.db_time = self.db_time() + time.perf_counter() - t0
+
             
     # getters
 
+    def get_tag(self, name):
+        """Return the value of a tag, None if it does not exist."""
+        res = self.raw_query("SELECT value FROM tags WHERE name = %s", (name,))
+        return res[0][0] if res else None
 
     # setters
 
+    def set_tag(self, name, value, cursor=None, commit=False):
+        """Insert or update a tag."""
+        if cursor is None:
+            cursor = self.connection.cursor()
+        cursor.execute(
+            "INSERT INTO tags (name, value) VALUES (%s, %s) "
+            "ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value;",
+            (name, value)
+        )
+        if commit:
+            self.commit()
+
 
     # bool queries
 
@@ -0,0 +1,94 @@
+# universe.py
+
+"""
+  Matrice alignée sociétés x jours de bourse (open, high, low, close, volume)
+  pour les calculs sur toutes les sociétés à la fois.
+
+  C'est le cube de prix publié par l'ETL (pricecube.py) s'il est à la version
+  courante des données ; sinon le dashboard le construit lui-même depuis
+  daystocks dans UNIVERSE_DIR, une seule fois par version pour tous les
+  workers (verrou sur un fichier).
+"""
+
+import fcntl
+import os
+import tempfile
+import warnings
+
+import numpy as np
+
+from app import db
+from pricecube import build_price_cube, current_cube
+from series import price_cube
+from symbols import data_version, get_companies
+
+UNIVERSE_DIR = os.environ.get("DASHBOARD_UNIVERSE_DIR",
+                              os.path.join(tempfile.gettempdir(), "bourse-universe"))
+
+
+def get_cube():
+    """The price cube of the current data version, None if daystocks is empty."""
+    cube = price_cube()
+    if cube is not None:
+        return cube
+    version = str(data_version())
+    cube = current_cube(UNIVERSE_DIR)
+    if cube is not None and cube.version == version:
+        return cube
+    os.makedirs(UNIVERSE_DIR, exist_ok=True)
+    with open(os.path.join(UNIVERSE_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # another worker may have built it while we waited
+        cube = current_cube(UNIVERSE_DIR)
+        if cube is None or cube.version != version:
+            build_price_cube(db, UNIVERSE_DIR, version)
+            cube = current_cube(UNIVERSE_DIR)
+    return cube
+
+
+def cache_version():
+    """The data version as used in the cache keys of results computed on the cube."""
+    return str(data_version())
+
+
+def forward_fill(values):
+    """Forward fill the NaN of a cids x days matrix along the days, leading NaN stay."""
+    valid = ~np.isnan(values)
+    idx = np.where(valid, np.arange(values.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return values[np.arange(values.shape[0])[:, None], idx]
+
+
+def company_labels(cids):
+    """symbol and name of each cid, empty strings for unknown ones."""
+    companies = get_companies()
+    if companies is None:
+        return [""] * len(cids), [""] * len(cids)
+    symbols = dict(zip(companies["id"], companies["symbol"].astype(str).str.strip()))
+    names = dict(zip(companies["id"], companies["name"].astype(str).str.strip()))
+    return [symbols.get(int(c), "") for c in cids], [names.get(int(c), "") for c in cids]
+
+
+def cids_of(symbols):
+    """Company ids of symbols, in the same order, unknown symbols dropped."""
+    companies = get_companies()
+    if companies is None:
+        return []
+    by_symbol = dict(zip(companies["symbol"].astype(str).str.strip(), companies["id"]))
+    return [int(by_symbol[s]) for s in symbols if s in by_symbol]
+
+
+def most_traded(n, days=60):
+    """The n company ids with the largest mean traded value (close x volume) over the last days."""
+    cube = get_cube()
+    if cube is None or len(cube.days) == 0:
+        return []
+    start = cube.days[max(0, len(cube.days) - days)]
+    close, _ = cube.matrix("close", None, start)
+    volume, _ = cube.matrix("volume", None, start)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # companies without a row in the period
+        traded = np.nanmean(close.astype(np.float64) * volume, axis=1)
+    traded = np.nan_to_num(traded, nan=-1.0)
+    best = np.argsort(traded)[::-1][:n]
+    return [int(cube.cids[i]) for i in best if traded[i] > 0]
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Évaluation des règles d'alerte sur les lignes de stocks au fil du chargement.
+
+  L'état de chaque société (dernier cours, RSI sur 14 relevés, volume du jour,
+  volumes des 20 derniers jours) est gardé dans des tableaux NumPy indexés par
+  cid : chaque relevé (toutes les sociétés d'une même date) est traité d'un
+  bloc et un lot ne coûte que son nombre de lignes. Les alertes se déclenchent
+  au franchissement d'un seuil, pas tant qu'il reste franchi.
+
+  Règles (table alert_rules, cid NULL pour toutes les sociétés) :
+    price_above, price_below -- le cours passe au-dessus / en dessous du seuil
+    volume_spike             -- volume du jour / moyenne des 20 derniers jours
+    rsi_above, rsi_below     -- RSI 14 des relevés au-dessus / en dessous du seuil
+"""
+
+import numpy as np
+import pandas as pd
+
+KINDS = ("price_above", "price_below", "volume_spike", "rsi_above", "rsi_below")
+RSI_WINDOW = 14
+VOLUME_DAYS = 20
+
+
+class AlertEngine:
+    def __init__(self, rules, size=1024):
+        self.rules = rules[rules["kind"].isin(KINDS)].reset_index(drop=True)
+        self.size = 0
+        self.last_date = None
+        self._grow(size)
+
+    def _grow(self, size):
+        """Enlarge the per cid arrays to hold cid size - 1."""
+        old = self.size
+        if size <= old:
+            return
+
+        def grown(name, shape_tail=(), fill=0.0, dtype=np.float64):
+            array = np.full((size,) + shape_tail, fill, dtype=dtype)
+            if old:
+                array[:old] = getattr(self, name)
+            setattr(self, name, array)
+
+        grown("last_value", fill=np.nan)
+        grown("last_rsi", fill=np.nan)
+        grown("last_ratio", fill=np.nan)
+        grown("day", fill=-1, dtype=np.int64)
+        grown("day_volume")
+        grown("gains", (RSI_WINDOW,))
+        grown("losses", (RSI_WINDOW,))
+        grown("gain_sum")
+        grown("loss_sum")
+        grown("rsi_count", dtype=np.int16)
+        grown("rsi_pos", dtype=np.int16)
+        grown("volumes", (VOLUME_DAYS,))
+        grown("volume_sum")
+        grown("volume_count", dtype=np.int16)
+        grown("volume_pos", dtype=np.int16)
+        self.size = size
+
+    def reset(self):
+        size = self.size
+        self.size = 0
+        self.last_date = None
+        self._grow(size)
+
+    def _push_volume(self, cids, volumes):
+        """Append one day of volume to the 20 day history of cids."""
+        pos = self.volume_pos[cids]
+        self.volume_sum[cids] += volumes - self.volumes[cids, pos]
+        self.volumes[cids, pos] = volumes
+        self.volume_count[cids] = np.minimum(self.volume_count[cids] + 1, VOLUME_DAYS)
+        self.volume_pos[cids] = (pos + 1) % VOLUME_DAYS
+
+    def warm_up(self, db, before):
+        """Fill the volume history with the daystocks of the VOLUME_DAYS days before before."""
+        before = pd.Timestamp(before)
+        df = db.df_query(
+            "SELECT date, cid, volume FROM daystocks WHERE date >= %s AND date < %s ORDER BY date",
+            params=(before - pd.Timedelta(days=2 * VOLUME_DAYS), before)
+        )
+        if df.empty:
+            return
+        df = df.dropna()
+        self._grow(int(df["cid"].max()) + 1)
+        for _, day in df.groupby("date", sort=True):
+            self._push_volume(day["cid"].to_numpy(dtype=np.int64), day["volume"].to_numpy(dtype=np.float64))
+
+    def _step(self, date, cids, values, volumes):
+        """One snapshot: update the state of cids and return the fired (rule_id, cid, value)."""
+        day = pd.Timestamp(date).normalize().value // 86_400_000_000_000
+        new_day = self.day[cids] != day
+        closing = cids[new_day & (self.day[cids] >= 0)]
+        self._push_volume(closing, self.day_volume[closing])
+        self.day[cids] = day
+        self.last_ratio[cids[new_day]] = 0.0
+        self.day_volume[cids] = volumes
+
+        prev_value = self.last_value[cids]
+        delta = np.where(np.isnan(prev_value), 0.0, values - prev_value)
+        pos = self.rsi_pos[cids]
+        gain, loss = np.maximum(delta, 0.0), np.maximum(-delta, 0.0)
+        self.gain_sum[cids] += gain - self.gains[cids, pos]
+        self.loss_sum[cids] += loss - self.losses[cids, pos]
+        self.gains[cids, pos] = gain
+        self.losses[cids, pos] = loss
+        self.rsi_pos[cids] = (pos + 1) % RSI_WINDOW
+        self.rsi_count[cids] = np.minimum(self.rsi_count[cids] + 1, RSI_WINDOW)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rsi = 100 - 100 / (1 + self.gain_sum[cids] / self.loss_sum[cids])
+            average = self.volume_sum[cids] / self.volume_count[cids]
+            ratio = np.where(average > 0, volumes / average, np.nan)
+        rsi = np.where(self.rsi_count[cids] == RSI_WINDOW, rsi, np.nan)
+
+        current = {"price": values, "rsi": rsi, "volume": ratio}
+        previous = {"price": prev_value, "rsi": self.last_rsi[cids], "volume": self.last_ratio[cids]}
+        fired = []
+        for rule in self.rules.itertuples():
+            measure = rule.kind.split("_")[0]
+            now, before = current[measure], previous[measure]
+            with np.errstate(invalid="ignore"):
+                if rule.kind.endswith("below"):
+                    hit = (before > rule.threshold) & (now <= rule.threshold)
+                else:
+                    hit = (before < rule.threshold) & (now >= rule.threshold)
+            if not pd.isna(rule.cid):
+                hit &= cids == int(rule.cid)
+            for i in np.flatnonzero(hit):
+                fired.append((rule.id, int(cids[i]), float(now[i])))
+
+        self.last_value[cids] = values
+        self.last_rsi[cids] = rsi
+        self.last_ratio[cids] = ratio
+        return fired
+
+    def process(self, df):
+        """Evaluate the rules on new stocks rows (date, cid, value, volume), return the alerts."""
+        columns = ["date", "rule_id", "cid", "value"]
+        if self.rules.empty or df.empty:
+            return pd.DataFrame(columns=columns)
+        df = df.sort_values("date", kind="stable")
+        self._grow(int(df["cid"].max()) + 1)
+        rows = []
+        for date, snap in df.groupby("date", sort=True):
+            snap = snap.drop_duplicates("cid", keep="last")
+            fired = self._step(date, snap["cid"].to_numpy(dtype=np.int64),
+                               snap["value"].to_numpy(dtype=np.float64),
+                               snap["volume"].to_numpy(dtype=np.float64))
+            rows.extend((date,) + f for f in fired)
+            self.last_date = date
+        return pd.DataFrame(rows, columns=columns)
@@ -1,20 +1,47 @@
 import os
+import io
+import sys
 import glob
 import re
 import time
 import csv
+import uuid
 
+import numpy as np
 import pandas as pd
 import timescaledb_model as tsdb
 from timescaledb_model import initial_markets_data
+from pricecube import build_price_cube
+from alerts import AlertEngine
+from pipeline import run_pipeline
+from memory import MemoryGovernor
 
 
 TSDB = tsdb.TimescaleStockMarketModel
 HOME = "/home/bourse/data/"
+CUBE_DIR = os.path.join(HOME, "cube")
+PARQUET_DIR = os.path.join(HOME, "parquet", "stocks")
+MARKET_ALIAS = {m[0]: m[2] for m in initial_markets_data}
+# change-only ticks: a row equal to the previous one of its cid is not stored; only
+# TSDB.stocks_query(fill=True) rebuilds them, the direct readers of stocks see gaps
+STOCKS_DEDUP = os.environ.get("ETL_STOCKS_DEDUP", "0") == "1"
+DEDUP_LOOKBACK = tsdb.STOCKS_FILL_LIMIT  # how far back the last stored row of a cid is looked for
+# bourso pipeline: reader threads, parser processes, queue bound, rows per write to
+# the database; sized by the memory governor (ETL_MEMORY_BUDGET) unless set here
+PIPELINE_OVERRIDES = {k: int(os.environ[v]) for k, v in (("readers", "ETL_READERS"), ("workers", "ETL_WORKERS"),
+                                                         ("depth", "ETL_QUEUE_DEPTH")) if os.environ.get(v)}
+WRITE_BATCH_ROWS = int(os.environ["ETL_BATCH_ROWS"]) if os.environ.get("ETL_BATCH_ROWS") else None
+# reload a period in an UNLOGGED staging table swapped in at the end, 0: DELETE then INSERT
+ATOMIC_RELOAD = os.environ.get("ETL_ATOMIC_RELOAD", "1") == "1"
+COPY_STREAMS = int(os.environ.get("ETL_COPY_STREAMS", 4))  # connections writing the stocks at once
+STOCKS_COLUMNS = ['date', 'cid', 'value', 'volume']
+COMPRESSION = {".bz2": "bz2", ".gz": "gzip", ".xz": "xz", ".zip": "zip", ".zst": "zstd"}
 CLEAN_LAST_REGEX = re.compile(r"\(c\)\s*$")
 BASE_SYMBOL_REGEX = re.compile(r"^1rP")
 DATETIME_REGEX = re.compile(r"(\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2}(?:\.\d+)?))")
 
+governor = MemoryGovernor()  # memory budget of the run
+
 
 def timer_decorator(func):
     def wrapper(*args, **kwargs):
@@ -74,6 +101,30 @@ def detect_header_xlsx(path: str) -> pd.DataFrame:
     raise ValueError(f"Header introuvable dans {path}")
 
 
+def to_float32(values) -> pd.Series:
+    """Numbers of a column as FLOAT4, NaN where they do not parse."""
+    return pd.to_numeric(values, errors="coerce").astype("float32")
+
+
+def daystocks_frame(datetime, symbol, open_, close, high, low, volume) -> pd.DataFrame:
+    """
+    Rows of daystocks in the dtypes of the table: datetime64 days, a
+    categorical symbol (the cid is set by the caller from it) and float32
+    prices, mean and std being NaN (NULL).
+    """
+    df = pd.DataFrame({
+        "date":   datetime.dt.floor("D"),
+        "symbol": symbol.astype("category"),
+        "open":   to_float32(open_),
+        "close":  to_float32(close),
+        "high":   to_float32(high),
+        "low":    to_float32(low),
+        "volume": to_float32(volume),
+    }).dropna(subset=["date","open","close","high","low","volume"])
+    df["mean"] = df["std"] = np.float32("nan")
+    return df
+
+
 def compute_csv(path: str, start_dt, end_dt) -> pd.DataFrame:
     df = detect_header_csv(path)
     df = df.dropna(subset=["Last Date/Time", "Symbol"])
@@ -83,18 +134,7 @@ def compute_csv(path: str, start_dt, end_dt) -> pd.DataFrame:
         errors="coerce"
     )
     df = df[(df["datetime"] >= start_dt) & (df["datetime"] <= end_dt)]
-    return pd.DataFrame({
-        "date":   df["datetime"].dt.floor("D"),
-        "symbol": df["Symbol"],
-        "cid":    None,
-        "open":   pd.to_numeric(df["Open"],  errors="coerce"),
-        "close":  pd.to_numeric(df["Last"],  errors="coerce"),
-        "high":   pd.to_numeric(df["High"],  errors="coerce"),
-        "low":    pd.to_numeric(df["Low"],   errors="coerce"),
-        "volume": pd.to_numeric(df["Volume"],errors="coerce"),
-        "mean":   None,
-        "std":    None,
-    }).dropna(subset=["date","open","close","high","low","volume"])
+    return daystocks_frame(df["datetime"], df["Symbol"], df["Open"], df["Last"], df["High"], df["Low"], df["Volume"])
 
 
 def compute_xlsx(path: str, start_dt, end_dt) -> pd.DataFrame:
@@ -106,23 +146,19 @@ def compute_xlsx(path: str, start_dt, end_dt) -> pd.DataFrame:
         errors="coerce"
     )
     df = df[(df["datetime"] >= start_dt) & (df["datetime"] <= end_dt)]
-    return pd.DataFrame({
-        "date":   df["datetime"].dt.floor("D"),
-        "symbol": df["Symbol"],
-        "cid":    None,
-        "open":   pd.to_numeric(df["Open Price"], errors="coerce"),
-        "close":  pd.to_numeric(df["last Price"],  errors="coerce"),
-        "high":   pd.to_numeric(df["High Price"], errors="coerce"),
-        "low":    pd.to_numeric(df["low Price"],  errors="coerce"),
-        "volume": pd.to_numeric(df["Volume"],     errors="coerce"),
-        "mean":   None,
-        "std":    None,
-    }).dropna(subset=["date","open","close","high","low","volume"])
+    return daystocks_frame(df["datetime"], df["Symbol"], df["Open Price"], df["last Price"],
+                           df["High Price"], df["low Price"], df["Volume"])
 
 
 def compute_gz2(path: str) -> pd.DataFrame:
     return pd.read_pickle(path)
 
+
+def file_datetime(path: str) -> str:
+    """Timestamp of a bourso file in its name, the order of the pipeline."""
+    m = DATETIME_REGEX.search(os.path.basename(path))
+    return m.group(1) if m else ""
+
 @timer_decorator
 def fill_missing_daystocks(start, end, db: TSDB):
     start_dt = pd.to_datetime(start)
@@ -143,9 +179,8 @@ def fill_missing_daystocks(start, end, db: TSDB):
     if missing.empty:
         print("Aucun jour manquant à remplir.")
         return
-    df_stocks = db.df_query(
-        "SELECT date, cid, value, volume FROM stocks WHERE date >= '%s' AND date <= '%s'" % (start_dt, end_dt)
-    )
+    # rebuild the unchanged snapshots dropped by the change-only ingest
+    df_stocks = db.stocks_query(start_dt, end_dt, fill=db.get_tag("stocks_dedup") == "1")
     df_stocks['date'] = pd.to_datetime(df_stocks['date']).dt.floor('D')
     agg = df_stocks.groupby(['date','cid']).agg(
         open=('value','first'),
@@ -160,7 +195,7 @@ def fill_missing_daystocks(start, end, db: TSDB):
     if to_insert.empty:
         print("Pas de données Boursorama pour les jours manquants.")
         return
-    db.df_write(to_insert, 'daystocks', if_exists='append', index=False)
+    db.df_write(to_insert, 'daystocks', if_exists='append', index=False, chunksize=governor.copy_rows(to_insert))
     db.commit()
     #print(f"✓ {len(to_insert)} jours manquants remplis depuis Boursorama.")
 
@@ -241,28 +276,75 @@ def process_stocks(df, file_path, symbol_to_cid):
         raise ValueError(f"Invalid datetime: {filename}")
 
     df = df[['symbol', 'last', 'volume']].dropna()
-    df['value'] = pd.to_numeric(df['last'].str.replace(CLEAN_LAST_REGEX, '', regex=True).str.strip(), errors='coerce')
-    df['volume'] = pd.to_numeric(df['volume'], errors='coerce')
+    value = to_float32(df['last'].str.replace(CLEAN_LAST_REGEX, '', regex=True).str.strip())
+    volume = to_float32(df['volume'])
+    cids = df['symbol'].str.replace(BASE_SYMBOL_REGEX, '', regex=True).map(symbol_to_cid)
 
-    valid = df['value'].notna() & df['volume'].notna()
-    df = df.loc[valid]
+    # the dtypes of the stocks table: no float64 nor object column reaches the concat
+    valid = value.notna() & volume.notna() & cids.notna()
+    return pd.DataFrame({
+        'date': np.full(int(valid.sum()), file_dt.to_datetime64()),
+        'cid': cids[valid].to_numpy(dtype='int16'),
+        'value': value[valid].to_numpy(),
+        'volume': volume[valid].to_numpy(),
+    })
 
-    symbols = df['symbol'].str.replace(BASE_SYMBOL_REGEX, '', regex=True)
-    cids = symbols.map(symbol_to_cid)
 
-    valid_cids = cids.notna()
-    df = df.loc[valid_cids]
-    df = df.assign(
-        cid=cids.loc[valid_cids].astype(int),
-        date=file_dt
-    )
-    return df[['date', 'cid', 'value', 'volume']]
 
 
+_symbol_to_cid = None  # set in each parser process by _init_parser
+
+
+def _init_parser(symbol_to_cid):
+    global _symbol_to_cid
+    _symbol_to_cid = symbol_to_cid
+
+
+def parse_stocks_file(path: str, data: bytes):
+    """Decompress and transform one bourso file read by the pipeline, None if invalid."""
+    try:
+        df_raw = pd.read_pickle(io.BytesIO(data), compression=COMPRESSION.get(os.path.splitext(path)[1]))
+        return process_stocks(df_raw, path, _symbol_to_cid)
+    except ValueError:
+        return None
+
+
+def dedup_stocks(df: pd.DataFrame, previous: pd.DataFrame, keyframe: str = tsdb.STOCKS_KEYFRAME) -> pd.DataFrame:
+    """
+    Drop the rows whose value and volume are those of the previous row of the
+    same cid. previous holds the last stored row of each cid (date, cid,
+    value, volume) for the first row of the batch. Compared as FLOAT4, as
+    stored. An unchanged row is kept when it starts a new keyframe period
+    after the last stored row, so no row is more than keyframe away from a
+    stored one, within the fill limit of stocks_query.
+    """
+    df = df.sort_values(['cid', 'date'], kind='stable')
+    value = df['value'].astype('float32')
+    volume = df['volume'].astype('float32')
+    prev_value = value.groupby(df['cid']).shift()
+    prev_volume = volume.groupby(df['cid']).shift()
+    first = ~df['cid'].duplicated()
+    if not previous.empty:
+        last = previous.set_index('cid')
+        prev_value[first] = df.loc[first, 'cid'].map(last['value'].astype('float32'))
+        prev_volume[first] = df.loc[first, 'cid'].map(last['volume'].astype('float32'))
+    unchanged = (value == prev_value) & (volume == prev_volume)
+
+    # start of each run of unchanged rows: a changed row, or the last stored row
+    start = df['date'].where(~unchanged)
+    if not previous.empty:
+        start[first & unchanged] = df.loc[first & unchanged, 'cid'].map(last['date'])
+    start = start.groupby(df['cid']).ffill()
+    period = (df['date'] - start) // pd.Timedelta(keyframe)
+    prev_period = period.groupby(df['cid']).shift()
+    prev_period[first] = 0  # the last stored row starts the first run
+    keep = ~unchanged | (period != prev_period)
+    return df.loc[keep].sort_values('date', kind='stable', ignore_index=True)
 
 
 @timer_decorator
-def store_files(start: str, end: str, website: str, db: TSDB):
+def store_files(start: str, end: str, website: str, db: TSDB, dedup: bool = STOCKS_DEDUP,
+                atomic: bool = ATOMIC_RELOAD):
     start_dt, end_dt = pd.to_datetime(start), pd.to_datetime(end)
     files = get_all_files(website, start_dt, end_dt)
     store_files_done(files, db)
@@ -275,54 +357,311 @@ def store_files(start: str, end: str, website: str, db: TSDB):
         for f in files:
             df_day = compute_csv(f, start_dt, end_dt) if f.endswith('.csv') else compute_xlsx(f, start_dt, end_dt)
             df_day = df_day.loc[df_day['symbol'].isin(symbol_to_cid)]
-            df_day['cid'] = df_day['symbol'].map(symbol_to_cid).astype(int)
+            df_day.insert(1, 'cid', df_day['symbol'].map(symbol_to_cid).astype('int16'))
             all_days.append(df_day.drop(columns=['symbol']))
         if all_days:
             full = pd.concat(all_days, ignore_index=True)
-            db.df_write(full, 'daystocks', if_exists='append', index=False)
+            db.df_write(full, 'daystocks', if_exists='append', index=False, chunksize=governor.copy_rows(full))
             db.commit()
 
     else:
-        db.execute(
-            "DELETE FROM stocks WHERE date >= %s AND date <= %s;",
-            (start_dt, end_dt), commit=True
-        )
-        comp = db.df_query("SELECT id AS cid, symbol FROM companies")
+        if atomic:
+            target = db.create_staging('stocks')
+        else:
+            target = 'stocks'
+            db.execute(
+                "DELETE FROM stocks WHERE date >= %s AND date <= %s;",
+                (start_dt, end_dt), commit=True
+            )
+        comp = db.df_query("SELECT id AS cid, symbol, mid FROM companies")
         symbol_to_cid = dict(zip(comp['symbol'], comp['cid']))
-        stocks_list = []
-        for f in files:
-            try:
-                df_raw = compute_gz2(f)
-                stocks_list.append(process_stocks(df_raw, f, symbol_to_cid))
-            except ValueError:
+        writer = StocksWriter(db, start_dt, end_dt, dict(zip(comp['cid'], comp['mid'])), dedup, table=target)
+        sizing = {**governor.pipeline(files), **PIPELINE_OVERRIDES}
+        try:
+            stats = run_pipeline(
+                sorted(files, key=lambda f: (file_datetime(f), f)), parse_stocks_file, writer.add,
+                initializer=_init_parser, initargs=(symbol_to_cid,), observe=governor.observe, **sizing
+            )
+            writer.close()
+            if atomic:
+                dropped = db.replace_range('stocks', target, start_dt, writer.upper)
+                print(f"reload: {dropped} chunks dropped")
+        except BaseException:
+            writer.abort()
+            if atomic:
+                # the stocks, alerts and archive of the period are left untouched
+                db.drop_staging(target)
+            raise
+        writer.publish()
+        print("pipeline: " + ", ".join(f"{k} {v:.2f}s" for k, v in stats.items())
+              + f", {writer.stored} / {writer.total} rows stored, {sizing}")
+        return writer.total
+
+
+class StocksWriter:
+    """
+    Writer stage of the bourso pipeline. The parsed files arrive in time
+    order and are written by batches, of batch_rows rows or as large as the
+    memory governor allows, cut between two timestamps: the alert engine
+    sees the ticks in order, and the dedup carries the last row of each cid
+    from one batch to the next. Each batch adds its own files to the Parquet
+    archive. The stocks rows go through the COPY_STREAMS connections of a
+    ParallelCopyWriter into table (stocks or its staging table) and are
+    committed together by close(), or rolled back by abort(). The alerts and
+    the archive of the period are only replaced by publish(), once the stocks
+    rows are in place.
+    """
+
+    def __init__(self, db: TSDB, start_dt, end_dt, cid_to_mid: dict, dedup: bool,
+                 batch_rows: int = WRITE_BATCH_ROWS, table: str = 'stocks'):
+        self.db = db
+        self.end_dt = end_dt
+        self.dedup = dedup
+        self.batch_rows = batch_rows
+        self.lower = self.lower_bound = start_dt
+        self.frames, self.rows = [], 0
+        self.previous = None
+        self.stored = self.total = 0
+        self.upper = end_dt  # end of the range written, the last tick if it is after end_dt
+        self.copy = db.copy_writer(table, STOCKS_COLUMNS, streams=COPY_STREAMS, hypertable='stocks')
+        self.committed = False
+        self.archive = ParquetArchive(cid_to_mid)
+        self.alerts = []  # fired alerts of the batches, stored by publish()
+        if dedup:
+            self.previous = db.df_query(
+                "SELECT DISTINCT ON (cid) date, cid, value, volume FROM stocks "
+                "WHERE date >= %s AND date < %s ORDER BY cid, date DESC",
+                params=(start_dt - pd.Timedelta(DEDUP_LOOKBACK), start_dt), parse_dates=['date']
+            )
+            if not self.previous.empty and self.previous['date'].dt.tz is not None:
+                # the ticks of the files are naive UTC wall times
+                self.previous['date'] = self.previous['date'].dt.tz_convert(None)
+            db.set_tag("stocks_dedup", "1", commit=True)
+
+    def add(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        ready = self.rows >= self.batch_rows if self.batch_rows else governor.should_flush(self.rows)
+        if ready and self.frames and df['date'].iat[0] > self.frames[-1]['date'].iat[-1]:
+            self.flush(self.frames[-1]['date'].iat[-1])
+        self.frames.append(df)
+        self.rows += len(df)
+
+    def flush(self, upper):
+        """Write the batch as the rows of [self.lower, upper]."""
+        full = pd.concat(self.frames, ignore_index=True)
+        self.frames, self.rows = [], 0
+        stored = full
+        if self.dedup:
+            stored = dedup_stocks(full, self.previous)
+            # the last stored row of a cid has the values of its last row
+            self.previous = pd.concat([self.previous, stored[['date', 'cid', 'value', 'volume']]]) \
+                .drop_duplicates('cid', keep='last')
+        self.copy.write(stored)
+        self.alerts.append(fire_alerts(full, self.db))
+        self.archive.write(full)
+        self.lower = upper + pd.Timedelta(1, 'us')
+        self.stored += len(stored)
+        self.total += len(full)
+
+    def close(self):
+        if self.frames:
+            self.upper = max(self.end_dt, self.frames[-1]['date'].iat[-1])
+            self.flush(self.upper)
+        self.copy.commit()
+        self.committed = True
+
+    def publish(self):
+        """Once the stocks rows are in place, replace the alerts and the archive of the period."""
+        if self.alerts:
+            store_alerts(pd.concat(self.alerts, ignore_index=True), self.lower_bound, self.upper, self.db)
+        self.archive.publish(self.lower_bound, self.upper)
+
+    def abort(self):
+        if not self.committed:
+            self.copy.abort()
+        self.archive.discard()
+        forget_alerts()
+
+
+alert_engine = None  # AlertEngine of the run, its state follows the loaded ticks
+
+
+def fire_alerts(full: pd.DataFrame, db: TSDB) -> pd.DataFrame:
+    """Fire the alert rules on a batch of ticks, in time order, and return the alerts."""
+    global alert_engine
+    if alert_engine is None:
+        db.ensure_alert_tables()
+        alert_engine = AlertEngine(db.get_alert_rules())
+    if not alert_engine.rules.empty and \
+            (alert_engine.last_date is None or full['date'].min() <= alert_engine.last_date):
+        # first batch or a reload of the past: start again from the daily volumes
+        alert_engine.reset()
+        alert_engine.warm_up(db, full['date'].min())
+    return alert_engine.process(full)
+
+
+def forget_alerts():
+    """The ticks given to fire_alerts were not stored: the next batch starts again."""
+    if alert_engine is not None:
+        alert_engine.last_date = None
+
+
+@timer_decorator
+def store_alerts(fired: pd.DataFrame, start_dt, end_dt, db: TSDB):
+    """Replace the alerts of [start_dt, end_dt] by fired."""
+    db.execute(
+        "DELETE FROM alerts WHERE date >= %s AND date <= %s;",
+        (start_dt, end_dt), commit=True
+    )
+    if not fired.empty:
+        db.df_write(fired, 'alerts', if_exists='append', index=False)
+        db.commit()
+
+
+def _write_parquet(target: str, df: pd.DataFrame):
+    """Write ticks sorted by cid then date to target, atomically."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = df.sort_values(['cid', 'date'], ignore_index=True)
+    schema = pa.schema([("date", pa.timestamp("us")), ("cid", pa.int16()),
+                        ("value", pa.float32()), ("volume", pa.float32())])
+    table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # hidden from the dataset readers until it is complete
+    tmp = os.path.join(os.path.dirname(target), "." + os.path.basename(target) + ".tmp")
+    pq.write_table(table, tmp, use_dictionary=True, compression="zstd",
+                   row_group_size=128 * 1024, write_statistics=True)
+    os.replace(tmp, target)
+
+
+def clear_parquet_range(start_dt, end_dt):
+    """
+    Remove the rows of [start_dt, end_dt] from every partition of the
+    archive, those of the markets that get no new rows included.
+    """
+    import pyarrow.parquet as pq
+
+    for month in pd.period_range(start_dt, end_dt, freq='M'):
+        pattern = os.path.join(PARQUET_DIR, "market=*", f"year={month.year}", f"month={month.month:02d}", "part-*.parquet")
+        for path in glob.glob(pattern):
+            dates = pq.read_table(path, columns=['date']).column('date').to_pandas()
+            inside = (dates >= start_dt) & (dates <= end_dt)
+            if not inside.any():
                 continue
-        if stocks_list:
-            full = pd.concat(stocks_list, ignore_index=True)
-            db.df_write(full, 'stocks', if_exists='append', index=False)
-            db.commit()
+            if inside.all():
+                os.remove(path)
+            else:
+                df = pq.read_table(path).to_pandas()
+                _write_parquet(path, df[~inside.to_numpy()])
 
 
+class ParquetArchive:
+    """
+    Ticks of one load for the Hive partitioned archive market=/year=/month=.
+    Each write() adds one file per partition, sorted by cid then date, so a
+    batch costs its own rows and never rewrites a partition. The files are
+    named _pending-* until publish(), hidden from the readers (pyarrow skips
+    the names starting with _); publish() then replaces the rows of the
+    period, like the DELETE + INSERT of the stocks table.
+    """
+
+    def __init__(self, cid_to_mid: dict):
+        self.cid_to_mid = cid_to_mid
+        self.run = uuid.uuid4().hex[:8]
+        self.batch = 0
+        self.pending = []  # (pending path, published path)
+
+    def write(self, full: pd.DataFrame):
+        df = full[STOCKS_COLUMNS]
+        market = df['cid'].map(self.cid_to_mid).map(MARKET_ALIAS).fillna("other")
+        for (alias, year, month), part in df.groupby([market, df['date'].dt.year, df['date'].dt.month]):
+            directory = os.path.join(PARQUET_DIR, f"market={alias}", f"year={year}", f"month={month:02d}")
+            name = f"{self.run}-{self.batch:05d}.parquet"
+            pending = os.path.join(directory, "_pending-" + name)
+            _write_parquet(pending, part)
+            self.pending.append((pending, os.path.join(directory, "part-" + name)))
+        self.batch += 1
+
+    @timer_decorator
+    def publish(self, start_dt, end_dt):
+        """Replace the rows of [start_dt, end_dt] in the archive by the written ones."""
+        clear_parquet_range(start_dt, end_dt)
+        for pending, target in self.pending:
+            os.replace(pending, target)
+        self.pending = []
+
+    def discard(self):
+        for pending, _ in self.pending:
+            if os.path.exists(pending):
+                os.remove(pending)
+        self.pending = []
+
+
+@timer_decorator
+def restore_stocks_from_archive(start: str, end: str, db: TSDB):
+    """Reload the stocks table of a period from the Parquet archive, without the source files."""
+    start_dt, end_dt = pd.to_datetime(start), pd.to_datetime(end)
+    full = db.parquet_query(PARQUET_DIR, start_dt, end_dt, columns=STOCKS_COLUMNS)
+    if full.empty:
+        return
+    staging = db.create_staging('stocks')
+    try:
+        # a backfill spans many chunks, one stream per chunk
+        with db.copy_writer(staging, STOCKS_COLUMNS, streams=COPY_STREAMS, shard_by="chunk",
+                            hypertable='stocks') as copy:
+            step = WRITE_BATCH_ROWS or governor.batch_rows()
+            for begin in range(0, len(full), step):
+                copy.write(full.iloc[begin:begin + step])
+    except BaseException:
+        db.drop_staging(staging)
+        raise
+    db.replace_range('stocks', staging, start_dt, end_dt)
+
+
+
+@timer_decorator
+def refresh_active_companies(db: TSDB):
+    db.refresh_active_companies()
+
+
+@timer_decorator
+def store_price_cube(db: TSDB):
+    """Rebuild the memory-mapped daily price cube read by the dashboard."""
+    build_price_cube(db, CUBE_DIR, db.get_data_version())
 
 
 def cycle(start: str, end: str):
+    """Load bourso by periods of a month, shorter if a month of stocks does not fit in the memory budget."""
     start_dt = pd.to_datetime(start)
     end_dt   = pd.to_datetime(end)
     chunks   = []
     current  = start_dt
     while current < end_dt:
-        next_month = current + pd.DateOffset(months=1)
-        chunk_end  = next_month if next_month <= end_dt else end_dt
+        days = governor.period_days()
+        next_start = current + (pd.DateOffset(months=1) if days >= 31 else pd.Timedelta(days=days))
+        chunk_end  = next_start if next_start <= end_dt else end_dt
         chunks.append((
             current.strftime('%Y-%m-%d'),
             chunk_end.strftime('%Y-%m-%d')
         ))
         print(chunks)
-        store_files(current.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d'), "bourso", db)
+        rows = store_files(current.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d'), "bourso", db)
+        governor.period_loaded(rows, (chunk_end - current).days)
         fill_missing_daystocks(current.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d'), db)
-        current = next_month
+        current = next_start
     return chunks
 
 if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "restore":
+        # pipenv run python3 etl.py restore 2021-01-01 2021-02-01
+        # reloads the stocks of the period from the Parquet archive, the rest of the base is kept
+        db = TSDB("bourse", "ricou", "db", "monmdp")
+        restore_stocks_from_archive(sys.argv[2], sys.argv[3], db)
+        refresh_active_companies(db)
+        store_price_cube(db)
+        sys.exit(0)
     print("Go Extract Transform and Load")
     pd.set_option("display.max_columns", None)
     db = TSDB("bourse", "ricou", "db", "monmdp", remove_all=True)
@@ -332,6 +671,9 @@ if __name__ == "__main__":
     store_files(start_date, end_date, "euronext", db)
     cycle(start_date, end_date)
     store_markets(db)
+    refresh_active_companies(db)
+    store_price_cube(db)
+    print(governor.report())
     # store_files(start_date, end_date, "euronext", db)
     # store_files(start_date, end_date, "bourso", db)
     # fill_missing_daystocks(start_date, end_date, db)
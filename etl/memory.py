@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Budget mémoire de l'ETL.
+
+  Le budget vient de ETL_MEMORY_BUDGET (« 4G », « 512M », en octets sinon)
+  ou, par défaut, de la moitié de la mémoire disponible (/proc/meminfo et la
+  limite du cgroup du conteneur). Le gouverneur mesure pendant le
+  chargement la taille réelle d'une ligne des tableaux transformés et en
+  déduit le nombre de parseurs, la profondeur des files du pipeline, la
+  taille des lots écrits, celle des COPY et la longueur des périodes de
+  cycle() : le même ETL tourne sur un portable et sur un gros serveur sans
+  réglage. Le pic de mémoire résidente est donné dans le bilan.
+"""
+
+import os
+import resource
+
+import pandas as pd
+
+# shares of the budget
+BATCH_SHARE = 0.4    # rows of the writer batch, with the copies made by concat, dedup and CSV
+WORKERS_SHARE = 0.3  # parser processes
+QUEUES_SHARE = 0.1   # raw files and parsed frames waiting in the pipeline queues
+FILL_SHARE = 0.5     # stocks of a period read back by fill_missing_daystocks
+BATCH_COPIES = 4     # a batch is held about 4 times while it is written
+FILL_COPIES = 3      # the groupby of the daily aggregates
+WORKER_BASE = 150 << 20  # a spawned parser with pandas imported
+EXPANSION = 10       # parsed frame / compressed file, until measured
+DEFAULT_ROW_BYTES = 100
+MIN_BATCH_ROWS = 10_000  # below, the batches cost more in round trips than they save
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+def parse_size(text):
+    """Bytes of a size like 4G, 512M or 1048576."""
+    text = str(text).strip().upper().rstrip("B")
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def available_memory():
+    """Bytes that can be used: MemAvailable, bounded by the cgroup limit."""
+    available = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    for limit_file, usage_file in (("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),
+                                   ("/sys/fs/cgroup/memory/memory.limit_in_bytes",
+                                    "/sys/fs/cgroup/memory/memory.usage_in_bytes")):
+        try:
+            with open(limit_file) as f:
+                limit = f.read().strip()
+            with open(usage_file) as f:
+                usage = int(f.read().strip())
+        except (OSError, ValueError):
+            continue
+        if limit.isdigit() and int(limit) < 1 << 60:
+            free = max(int(limit) - usage, 0)
+            available = free if available is None else min(available, free)
+        break
+    return available
+
+
+def peak_rss():
+    """Peak resident memory of this process and of its largest child, in bytes."""
+    # ru_maxrss is in kB on Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024)
+
+
+class MemoryGovernor:
+    def __init__(self, budget=None):
+        if budget is None and os.environ.get("ETL_MEMORY_BUDGET"):
+            budget = parse_size(os.environ["ETL_MEMORY_BUDGET"])
+        if budget is None:
+            available = available_memory()
+            budget = available // 2 if available else 2 << 30
+        self.budget = int(budget)
+        self.row_bytes = None    # measured bytes per row of a parsed frame
+        self.expansion = None    # measured parsed bytes / file bytes
+        self.rows_per_day = None
+
+    def observe(self, df, file_bytes=None):
+        """Measure a parsed frame, made of file_bytes bytes of file."""
+        if df is None or df.empty:
+            return
+        size = int(df.memory_usage(deep=True, index=True).sum())
+        row_bytes = size / len(df)
+        # the largest seen: a budget must hold for the heaviest batches
+        self.row_bytes = row_bytes if self.row_bytes is None else max(self.row_bytes, row_bytes)
+        if file_bytes:
+            expansion = size / file_bytes
+            self.expansion = expansion if self.expansion is None else max(self.expansion, expansion)
+
+    def _row_bytes(self):
+        return self.row_bytes or DEFAULT_ROW_BYTES
+
+    def batch_rows(self):
+        """Rows of a writer batch."""
+        return max(MIN_BATCH_ROWS, int(self.budget * BATCH_SHARE / BATCH_COPIES / self._row_bytes()))
+
+    def should_flush(self, rows):
+        """True when a batch of rows rows must be written now.
+
+        Decided on the bytes of the batch (batch_rows), never below
+        MIN_BATCH_ROWS, not on the resident memory: the RSS does not shrink
+        once pandas has freed a batch, it would ask for a flush after every
+        file.
+        """
+        return rows >= self.batch_rows()
+
+    def copy_rows(self, df):
+        """chunksize of a df_write of df: the CSV buffer of a COPY holds this many rows."""
+        if df.empty:
+            return None
+        row_bytes = df.memory_usage(deep=True, index=True).sum() / len(df)
+        return max(1000, int(self.budget * BATCH_SHARE / BATCH_COPIES / row_bytes))
+
+    def pipeline(self, files):
+        """readers, workers and queue depth for loading files."""
+        sizes = [os.path.getsize(f) for f in files if os.path.exists(f)]
+        largest = max(sizes, default=1 << 20)
+        average = sum(sizes) / len(sizes) if sizes else largest
+        expansion = self.expansion or EXPANSION
+        per_worker = WORKER_BASE + largest * (1 + expansion)
+        workers = max(1, min((os.cpu_count() or 2) - 1, int(self.budget * WORKERS_SHARE // per_worker)))
+        # every file in flight is held raw then parsed
+        depth = int(self.budget * QUEUES_SHARE // (average * (1 + expansion)))
+        depth = max(2, min(64, depth))
+        return {"readers": min(8, depth), "workers": workers, "depth": depth}
+
+    def period_days(self):
+        """Days of a cycle() period: its stocks must fit in the budget when read back."""
+        if not self.rows_per_day:
+            return 31
+        day_bytes = self.rows_per_day * self._row_bytes() * FILL_COPIES
+        return max(1, min(31, int(self.budget * FILL_SHARE // day_bytes)))
+
+    def period_loaded(self, rows, days):
+        """Record the rows loaded for a period of days days."""
+        if rows and days:
+            rate = rows / days
+            self.rows_per_day = rate if self.rows_per_day is None else max(self.rows_per_day, rate)
+
+    def report(self):
+        """Summary of the budget and of the measured usage."""
+        main, children = peak_rss()
+        return (f"mémoire : budget {self.budget / 2**20:.0f} Mo, pic {main / 2**20:.0f} Mo (ETL), "
+                f"{children / 2**20:.0f} Mo (parseurs), {self._row_bytes():.0f} octets par ligne")
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Chargement en pipeline : lecture, décodage et écriture se recouvrent.
+
+  Des threads lisent les fichiers d'avance (le disque travaille), un pool de
+  processus les décompresse et les transforme (les CPU travaillent) et un
+  thread écrivain envoie les résultats à la base (Postgres travaille). Les
+  étapes communiquent par des files bornées : si l'écrivain prend du retard,
+  les parseurs puis les lecteurs attendent, la mémoire reste bornée à
+  quelques fichiers en vol par étape.
+
+  L'écrivain reçoit les résultats dans l'ordre des fichiers, ce que
+  demandent la déduplication et les alertes de l'ETL.
+"""
+
+import collections
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+_DONE = object()
+
+
+def _timed(function, *args):
+    """function(*args) and the seconds it took, also in a worker process."""
+    t0 = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - t0
+
+
+def read_bytes(path):
+    """Whole content of a file, read in a reader thread."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class _Writer(threading.Thread):
+    """Consumer thread calling write on each result, in order."""
+
+    def __init__(self, write, depth):
+        super().__init__(name="etl-writer", daemon=True)
+        self.write = write
+        self.queue = queue.Queue(maxsize=depth)
+        self.error = None
+        self.busy = 0.0
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                return
+            if self.error is not None:
+                continue  # drain so that the producer never blocks
+            t0 = time.perf_counter()
+            try:
+                self.write(item)
+            except BaseException as e:
+                self.error = e
+            self.busy += time.perf_counter() - t0
+
+    def put(self, item):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+
+def run_pipeline(items, parse, write, read=read_bytes, readers=4, workers=2, depth=8,
+                 initializer=None, initargs=(), observe=None):
+    """Read, parse and write items with the three stages running at once.
+
+    items -- the paths, in the order write must see them
+    parse -- parse(item, data) run in a process, must be picklable; None
+             results are not written
+    write -- write(result) run in the writer thread
+    read -- read(item) run in a reader thread
+    readers, workers -- threads reading, processes parsing (0: in this thread)
+    depth -- bound of each queue: reads ahead, parses in flight, results waiting
+    observe -- observe(result, size of the data read) called before write
+
+    Returns the busy time of each stage and the wall time in seconds: with
+    the stages overlapped, the wall time is close to the largest one.
+    """
+    writer = _Writer(write, depth)
+    writer.start()
+    stats = {"read": 0.0, "parse": 0.0, "write": 0.0, "wall": time.perf_counter()}
+
+    pool = None
+    if workers:
+        # spawn: the process forks no thread nor database connection
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=initializer, initargs=initargs)
+    elif initializer is not None:
+        initializer(*initargs)
+    try:
+        with ThreadPoolExecutor(readers, thread_name_prefix="etl-reader") as read_pool:
+            items = iter(items)
+            reads, parses = collections.deque(), collections.deque()
+
+            def fill_reads():
+                while len(reads) < depth:
+                    item = next(items, _DONE)
+                    if item is _DONE:
+                        return
+                    reads.append((item, read_pool.submit(_timed, read, item)))
+
+            def hand_over():
+                # the oldest parse goes to the writer, blocks if its queue is full
+                future, size = parses.popleft()
+                result, seconds = future.result()
+                stats["parse"] += seconds
+                if observe is not None:
+                    observe(result, size)
+                if result is not None:
+                    writer.put(result)
+
+            fill_reads()
+            while reads:
+                item, future = reads.popleft()
+                data, seconds = future.result()
+                stats["read"] += seconds
+                fill_reads()
+                if pool is None:
+                    parses.append((_Ready(_timed(parse, item, data)), len(data)))
+                else:
+                    parses.append((pool.submit(_timed, parse, item, data), len(data)))
+                while len(parses) >= (depth if pool is not None else 1):
+                    hand_over()
+            while parses:
+                hand_over()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        writer.queue.put(_DONE)
+        writer.join()
+    if writer.error is not None:
+        raise writer.error
+    stats["write"] = writer.busy
+    stats["wall"] = time.perf_counter() - stats["wall"]
+    return stats
+
+
+class _Ready:
+    """An already computed result, with the interface of a future."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Cube des prix journaliers : sociétés x jours de bourse x (open, high, low,
+  close, volume) en float32, dans un fichier mappé en mémoire.
+
+  L'ETL le reconstruit depuis daystocks après chaque chargement ; le dashboard
+  et les analyses le lisent avec np.memmap, les processus partagent donc les
+  mêmes pages via le cache du système. Une consultation par cid et dates est
+  une tranche de tableau, sans SQL.
+
+  Fichiers dans <path>/<version>/ : cids.npy, days.npy, ohlcv.npy, meta.json.
+  <path>/CURRENT contient la version publiée, remplacée atomiquement.
+  Ce fichier est partagé entre etl/ et dashboard/, comme timescaledb_model.py.
+"""
+
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def build_price_cube(db, path, version):
+    """Write the cube of all daystocks rows under path and publish it as version."""
+    df = db.df_query(
+        "SELECT date, cid, open, high, low, close, volume FROM daystocks ORDER BY cid, date",
+        parse_dates=["date"]
+    )
+    if df.empty:
+        return None
+    days = pd.to_datetime(df["date"])
+    if days.dt.tz is not None:
+        days = days.dt.tz_localize(None)
+    df["day"] = days.dt.floor("D").to_numpy(dtype="datetime64[D]")
+    # daystocks may hold duplicates for a day, the last row wins
+    df = df.drop_duplicates(subset=["cid", "day"], keep="last")
+
+    cids = np.unique(df["cid"].to_numpy()).astype(np.int16)
+    day_values = np.unique(df["day"].to_numpy())
+    rows = np.searchsorted(cids, df["cid"].to_numpy())
+    cols = np.searchsorted(day_values, df["day"].to_numpy())
+
+    version = str(version)
+    tmp = os.path.join(path, f".{version}.tmp")
+    final = os.path.join(path, version)
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    cube = np.lib.format.open_memmap(os.path.join(tmp, "ohlcv.npy"), mode="w+", dtype=np.float32,
+                                     shape=(len(cids), len(day_values), len(FIELDS)))
+    cube[:] = np.nan
+    for k, field in enumerate(FIELDS):
+        cube[rows, cols, k] = df[field].to_numpy(dtype=np.float32)
+    cube.flush()
+    del cube
+    np.save(os.path.join(tmp, "cids.npy"), cids)
+    np.save(os.path.join(tmp, "days.npy"), day_values.astype("datetime64[D]").astype(np.int64))
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"version": version, "fields": FIELDS,
+                   "shape": [len(cids), len(day_values), len(FIELDS)]}, f)
+
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+    current = os.path.join(path, "CURRENT")
+    with open(current + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(current + ".tmp", current)
+    # older versions go, a reader still mapping one keeps its pages
+    for name in os.listdir(path):
+        if name not in (version, "CURRENT") and not name.startswith("."):
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    return final
+
+
+class PriceCube:
+    """Read-only view of a published cube."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.cids = np.load(os.path.join(directory, "cids.npy"))
+        self.days = np.load(os.path.join(directory, "days.npy")).astype("datetime64[D]")
+        self.data = np.load(os.path.join(directory, "ohlcv.npy"), mmap_mode="r")
+        self.fields = {f: k for k, f in enumerate(self.meta["fields"])}
+
+    def day_range(self, start=None, end=None):
+        """Slice of the days between start and end, both included."""
+        lo = 0 if start is None else np.searchsorted(self.days, np.datetime64(pd.Timestamp(start).date(), "D"))
+        hi = len(self.days) if end is None else np.searchsorted(
+            self.days, np.datetime64(pd.Timestamp(end).date(), "D"), side="right")
+        return slice(lo, hi)
+
+    def rows(self, cids):
+        """Row of each cid in the cube, -1 if it has no data."""
+        cids = np.asarray(cids, dtype=np.int16)
+        pos = np.minimum(np.searchsorted(self.cids, cids), len(self.cids) - 1)
+        return np.where(self.cids[pos] == cids, pos, -1)
+
+    def series(self, cid, start=None, end=None):
+        """Daily rows of cid as a DataFrame (date, open, high, low, close, volume)."""
+        row = self.rows([cid])[0]
+        if row < 0:
+            return pd.DataFrame(columns=("date",) + FIELDS)
+        days = self.day_range(start, end)
+        values = self.data[row, days, :]
+        present = ~np.isnan(values[:, self.fields["close"]])
+        df = pd.DataFrame(np.asarray(values[present]), columns=self.meta["fields"])
+        df.insert(0, "date", self.days[days][present].astype("datetime64[ns]"))
+        return df
+
+    def matrix(self, field, cids=None, start=None, end=None):
+        """field for cids x days between start and end (NaN where no data) and the days."""
+        days = self.day_range(start, end)
+        if cids is None:
+            values = self.data[:, days, self.fields[field]]
+        else:
+            rows = self.rows(cids)
+            values = self.data[np.maximum(rows, 0), days, self.fields[field]]
+            values = np.where((rows >= 0)[:, None], values, np.nan)
+        return np.asarray(values), self.days[days]
+
+
+_lock = threading.Lock()
+_opened = {}  # path -> PriceCube
+
+
+def current_cube(path):
+    """The published cube under path, reopened when its version changes; None if absent."""
+    try:
+        with open(os.path.join(path, "CURRENT")) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    with _lock:
+        cube = _opened.get(path)
+        if cube is None or cube.version != version:
+            try:
+                cube = _opened[path] = PriceCube(os.path.join(path, version))
+            except (OSError, ValueError):
+                return None
+        return cube